@@ -0,0 +1,67 @@
+"""Benchmarks the vectorized cleaning helpers against the scalar ones.
+
+Usage:
+    python benchmarks/bench_cleaning.py [--rows 200000] [--repeat 3]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pandas as pd
+from src.utils import (
+    clean_phone, remove_accents,
+    clean_phone_series, remove_accents_series,
+)
+
+PHONE_SAMPLES = [
+    '(11) 3333-4444', '11999998888', '011999998888', '0119999988887', '3333-4444',
+    '(21)2222-3333 / (21) 2222-4444', 'Ramal 22 - 3333-4444', 'Não especificado',
+    '(A ) defi-nir.', '123', np.nan,
+]
+MUNICIPALITY_SAMPLES = [
+    'SÃO PAULO', 'Rio de Janeiro', 'Belo Horizonte', 'Goiânia', 'Maceió',
+    'São João del-Rei', 'Florianópolis', 'Ribeirão Preto', 'Cuiabá', np.nan,
+]
+
+
+def best_of(func, repeat):
+    """Returns the best wall-clock time of `repeat` calls to `func`."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    phones = pd.Series([rng.choice(PHONE_SAMPLES) for _ in range(args.rows)])
+    municipalities = pd.Series([rng.choice(MUNICIPALITY_SAMPLES) for _ in range(args.rows)]).str.lower()
+
+    cases = [
+        ('clean_phone', lambda: phones.apply(clean_phone), lambda: clean_phone_series(phones)),
+        ('remove_accents', lambda: municipalities.apply(remove_accents), lambda: remove_accents_series(municipalities)),
+    ]
+
+    print(f"{'function':<16}{'scalar (s)':>12}{'vectorized (s)':>16}{'speedup':>10}")
+    for name, scalar, vectorized in cases:
+        if not scalar().equals(vectorized()):
+            raise AssertionError(f"{name}: vectorized output differs from the scalar version")
+        scalar_time = best_of(scalar, args.repeat)
+        vectorized_time = best_of(vectorized, args.repeat)
+        print(f"{name:<16}{scalar_time:>12.3f}{vectorized_time:>16.3f}{scalar_time / vectorized_time:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""Generates a synthetic raw Prouni database (`table1` and `table2`) at any scale.
+
+Scale 1 has about as many courses and campuses as the 2018 extract; the
+values follow skewed distributions like the real data (a few courses,
+universities and states concentrate most of the offer) and carry the same
+dirty values the cleaning in `src/config.py` handles: missing values,
+padding whitespace, lowercase course states (`uf_busca`), mangled
+accents ("??rea"), phone numbers in assorted formats and duplicated course
+rows.
+
+Usage:
+    python benchmarks/generate_dataset.py [--scale 1] [--output benchmarks/data/prouni_1x.sqlite] [--seed 42]
+"""
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Rows of the 2018 extract, approximately.
+BASE_COURSES = 41_000
+BASE_CAMPUSES = 1_500
+
+# Rows generated and inserted at a time.
+CHUNKSIZE = 100_000
+
+# Share of the course rows repeated verbatim, as in the raw data.
+DUPLICATE_RATIO = 0.005
+
+TABLE1_COLUMNS = {
+    'grau': 'TEXT', 'turno': 'TEXT', 'mensalidade': 'REAL',
+    'bolsa_integral_cotas': 'REAL', 'bolsa_integral_ampla': 'REAL',
+    'bolsa_parcial_cotas': 'REAL', 'bolsa_parcial_ampla': 'REAL',
+    'curso_id': 'TEXT', 'curso_busca': 'TEXT', 'cidade_busca': 'TEXT', 'uf_busca': 'TEXT',
+    'cidade_filtro': 'TEXT', 'universidade_nome': 'TEXT', 'campus_nome': 'TEXT', 'campus_id': 'INTEGER',
+    'nota_integral_ampla': 'REAL', 'nota_integral_cotas': 'REAL',
+    'nota_parcial_ampla': 'REAL', 'nota_parcial_cotas': 'REAL',
+}
+
+TABLE2_COLUMNS = {
+    'id': 'INTEGER', 'nome': 'TEXT', 'logradouro': 'TEXT', 'numero': 'TEXT', 'complemento': 'TEXT',
+    'bairro': 'TEXT', 'cep': 'TEXT', 'municipio': 'TEXT', 'uf': 'TEXT', 'telefone': 'TEXT',
+}
+
+# state -> (relative weight, municipalities)
+STATES = {
+    'SP': (22, ['São Paulo', 'Campinas', 'Ribeirão Preto', 'Santos', 'São José dos Campos', 'Sorocaba']),
+    'MG': (10, ['Belo Horizonte', 'Uberlândia', 'Juiz de Fora', 'Montes Claros']),
+    'RJ': (8, ['Rio de Janeiro', 'Niterói', 'Duque de Caxias', 'Nova Iguaçu']),
+    'PR': (7, ['Curitiba', 'Londrina', 'Maringá', 'Cascavel']),
+    'RS': (6, ['Porto Alegre', 'Caxias do Sul', 'Pelotas', 'Santa Maria']),
+    'BA': (6, ['Salvador', 'Feira de Santana', 'Vitória da Conquista']),
+    'SC': (5, ['Florianópolis', 'Joinville', 'Blumenau']),
+    'GO': (4, ['Goiânia', 'Anápolis', 'Aparecida de Goiânia']),
+    'PE': (4, ['Recife', 'Olinda', 'Caruaru']),
+    'CE': (3, ['Fortaleza', 'Juazeiro do Norte', 'Sobral']),
+    'DF': (3, ['Brasília']),
+    'ES': (2, ['Vitória', 'Vila Velha', 'Serra']),
+    'PA': (2, ['Belém', 'Ananindeua', 'Santarém']),
+    'MA': (2, ['São Luís', 'Imperatriz']),
+    'MT': (2, ['Cuiabá', 'Várzea Grande', 'Rondonópolis']),
+    'MS': (2, ['Campo Grande', 'Dourados']),
+    'PB': (1.5, ['João Pessoa', 'Campina Grande']),
+    'RN': (1.5, ['Natal', 'Mossoró']),
+    'AM': (1.5, ['Manaus']),
+    'PI': (1, ['Teresina', 'Parnaíba']),
+    'AL': (1, ['Maceió', 'Arapiraca']),
+    'SE': (1, ['Aracaju']),
+    'TO': (1, ['Palmas', 'Araguaína']),
+    'RO': (1, ['Porto Velho', 'Ji-Paraná']),
+    'AC': (0.5, ['Rio Branco']),
+    'AP': (0.5, ['Macapá']),
+    'RR': (0.5, ['Boa Vista']),
+}
+
+COURSES = [
+    'Administração', 'Pedagogia', 'Direito', 'Ciências Contábeis', 'Enfermagem', 'Educação Física',
+    'Gestão de Recursos Humanos', 'Psicologia', 'Engenharia Civil', 'Fisioterapia', 'Nutrição',
+    'Análise e Desenvolvimento de Sistemas', 'Serviço Social', 'Engenharia de Produção', 'Logística',
+    'Arquitetura e Urbanismo', 'Biomedicina', 'Farmácia', 'Engenharia Mecânica', 'Marketing',
+    'Gestão Comercial', 'Processos Gerenciais', 'História', 'Letras - Português', 'Matemática',
+    'Ciências Biológicas', 'Sistemas de Informação', 'Engenharia Elétrica', 'Odontologia',
+    'Jornalismo', 'Publicidade e Propaganda', 'Ciência da Computação', 'Medicina Veterinária',
+    'Gastronomia', 'Estética e Cosmética', 'Radiologia', 'Geografia', 'Filosofia', 'Teologia',
+    'Medicina', 'Relações Internacionais', 'Design Gráfico', 'Agronomia', 'Química', 'Física',
+]
+
+UNIVERSITY_PREFIXES = ['Universidade', 'Centro Universitário', 'Faculdade', 'Instituto de Ensino Superior']
+UNIVERSITY_NAMES = [
+    'Paulista', 'Estácio de Sá', 'Anhanguera', 'Norte do Paraná', 'Nove de Julho', 'Católica',
+    'Presbiteriana Mackenzie', 'Cruzeiro do Sul', 'Luterana do Brasil', 'Salgado de Oliveira',
+    'Metodista', 'Tiradentes', 'Potiguar', 'Positivo', 'Fumec', 'São Judas Tadeu', 'Unip',
+    'Vale do Itajaí', 'Feevale', 'Integrada', 'Maurício de Nassau', 'Santa Cecília', 'do Sul de Minas',
+]
+
+DEGREES = ['Bacharelado', 'Licenciatura', 'Tecnológico']
+SHIFTS = ['Noturno', 'Curso a Distância', 'Matutino', 'Integral', 'Vespertino']
+
+# Dirty variants of the raw columns, as found in the 2018 extract.
+COMPLEMENTS = ['Bloco B', 'Sala 2', 'S/n -', ' - - ', '.', '-', 'S/N', 'n/d', '??rea 2', 'Lado ??mpar', '2º andar']
+DISTRICTS = ['Centro', 'Jardim América', '??gua Verde', '??guas Claras', 'Vila ??rea', '.', 'n/d', 'S/N', 'Boa Vista']
+PHONES = [
+    '({ddd}) 3{n:03d}-{m:04d}', '{ddd}9{n:04d}{m:04d}', '0{ddd}9{n:04d}{m:04d}', '3{n:03d}-{m:04d}',
+    '({ddd}){n:04d}-{m:04d} / ({ddd}) {m:04d}-{n:04d}', 'Ramal 22 - 3{n:03d}-{m:04d}',
+    'NI', '(A ) defi-nir.', 'S/N', '0', '',
+]
+
+
+def zipf_weights(n, exponent=1.1):
+    """Returns normalized weights that decay like a Zipf distribution."""
+    weights = 1 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def dirty(rng, values, padding=0.05, missing=0.01):
+    """Pads some values with whitespace and replaces some with None."""
+    values = np.asarray(values, dtype=object)
+    pad = rng.random(len(values)) < padding
+    values[pad] = [f' {value} ' for value in values[pad]]
+    values[rng.random(len(values)) < missing] = None
+    return values
+
+
+def generate_campuses(rng, n):
+    """Generates the rows of `table2`, plus the university and state of each campus."""
+    states = list(STATES)
+    state_weights = np.array([STATES[state][0] for state in states], dtype=float)
+    state = np.array(states)[rng.choice(len(states), n, p=state_weights / state_weights.sum())]
+
+    n_universities = max(10, n // 6)
+    universities = np.array([
+        f"{UNIVERSITY_PREFIXES[i % len(UNIVERSITY_PREFIXES)]} {UNIVERSITY_NAMES[i % len(UNIVERSITY_NAMES)]}"
+        + (f' {i // len(UNIVERSITY_NAMES) + 1}' if i >= len(UNIVERSITY_NAMES) else '')
+        for i in range(n_universities)
+    ])
+    university = universities[rng.choice(n_universities, n, p=zipf_weights(n_universities))]
+
+    municipality = np.array([rng.choice(STATES[uf][1]) for uf in state], dtype=object)
+    upper = rng.random(n) < 0.3
+    municipality[upper] = [name.upper() for name in municipality[upper]]
+
+    uf = state.astype(object)
+    padded = rng.random(n) < 0.05
+    uf[padded] = [f' {value}' for value in uf[padded]]
+
+    phones = []
+    for template in rng.choice(PHONES, n, p=zipf_weights(len(PHONES), 0.8)):
+        ddd, number, suffix = rng.integers(11, 99), rng.integers(0, 1000), rng.integers(0, 10000)
+        phones.append(template.format(ddd=ddd, n=number, m=suffix))
+
+    ids = np.arange(1, n + 1)
+    rows = zip(
+        ids.tolist(),
+        [f'Campus {i}' for i in ids],
+        dirty(rng, [f'Rua {i}, ' for i in ids], missing=0.02),
+        [str(number) for number in rng.integers(1, 5000, n)],
+        np.where(rng.random(n) < 0.4, None, rng.choice(COMPLEMENTS, n)).tolist(),
+        np.where(rng.random(n) < 0.05, None, rng.choice(DISTRICTS, n)).tolist(),
+        [f'{cep:05d}-000' for cep in rng.integers(1000, 99999, n)],
+        municipality.tolist(),
+        uf.tolist(),
+        np.where(rng.random(n) < 0.02, None, np.array(phones, dtype=object)).tolist(),
+    )
+    return list(rows), university, state, municipality
+
+
+def generate_courses(rng, n, campus_university, campus_state, campus_city, start=0):
+    """Generates `n` rows of `table1` for the given campuses."""
+    n_campuses = len(campus_university)
+    campus = rng.choice(n_campuses, n, p=zipf_weights(n_campuses, 0.6))
+    course = np.array(COURSES)[rng.choice(len(COURSES), n, p=zipf_weights(len(COURSES)))]
+
+    fee = np.round(rng.lognormal(6.6, 0.55, n), 2)
+    fee[course == 'Medicina'] *= 8
+    fee = np.where(rng.random(n) < 0.03, None, fee)
+
+    def scholarships(scale, missing):
+        values = rng.poisson(scale, n).astype(float)
+        return np.where(rng.random(n) < missing, None, values).tolist()
+
+    def grades():
+        values = np.round(rng.normal(620, 60, n).clip(450, 800), 2)
+        return np.where(rng.random(n) < 0.35, None, values).tolist()
+
+    uf = campus_state[campus].astype(object)
+    lower = rng.random(n) < 0.5
+    uf[lower] = [value.lower() for value in uf[lower]]
+
+    return list(zip(
+        dirty(rng, rng.choice(DEGREES, n, p=[0.6, 0.15, 0.25])).tolist(),
+        dirty(rng, rng.choice(SHIFTS, n, p=[0.45, 0.25, 0.12, 0.1, 0.08])).tolist(),
+        fee.tolist(),
+        scholarships(1.2, 0.01),
+        scholarships(2.5, 0.01),
+        scholarships(0.6, 0.01),
+        scholarships(1.1, 0.01),
+        [str(start + i) for i in range(n)],
+        dirty(rng, course, missing=0.002).tolist(),
+        dirty(rng, campus_city[campus], missing=0.002).tolist(),
+        dirty(rng, uf, missing=0.002).tolist(),
+        [None] * n,
+        dirty(rng, campus_university[campus], missing=0.002).tolist(),
+        dirty(rng, [f'Campus {i + 1}' for i in campus], missing=0.002).tolist(),
+        (campus + 1).tolist(),
+        grades(), grades(), grades(), grades(),
+    ))
+
+
+def generate(output, scale=1.0, seed=42, chunksize=CHUNKSIZE):
+    """Writes a synthetic raw database.
+
+    Args:
+        output (str or Path): The SQLite file to write; it is replaced if it exists.
+        scale (float, optional): The size relative to the 2018 extract.
+        seed (int, optional): The random seed, so equal arguments give equal files.
+        chunksize (int, optional): The number of course rows inserted at a time.
+
+    Returns:
+        dict: The number of rows written to each table.
+    """
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if output.exists():
+        output.unlink()
+
+    rng = np.random.default_rng(seed)
+    n_campuses = max(1, round(BASE_CAMPUSES * scale))
+    n_courses = max(1, round(BASE_COURSES * scale))
+
+    conn = sqlite3.connect(output)
+    try:
+        for table, columns in (('table1', TABLE1_COLUMNS), ('table2', TABLE2_COLUMNS)):
+            definition = ', '.join(f'"{name}" {sql_type}' for name, sql_type in columns.items())
+            conn.execute(f'CREATE TABLE {table} ({definition})')
+
+        campuses, university, state, city = generate_campuses(rng, n_campuses)
+        conn.executemany(f"INSERT INTO table2 VALUES ({', '.join('?' * len(TABLE2_COLUMNS))})", campuses)
+
+        insert = f"INSERT INTO table1 VALUES ({', '.join('?' * len(TABLE1_COLUMNS))})"
+        written = 0
+        for start in range(0, n_courses, chunksize):
+            rows = generate_courses(rng, min(chunksize, n_courses - start), university, state, city, start)
+            duplicates = rng.choice(len(rows), int(len(rows) * DUPLICATE_RATIO), replace=False)
+            rows += [rows[i] for i in duplicates]
+            conn.executemany(insert, rows)
+            written += len(rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return {'table1': written, 'table2': n_campuses}
+
+
+def default_path(scale):
+    """Returns the default location of the database of a scale."""
+    return Path(__file__).resolve().parent / 'data' / f'prouni_{scale:g}x.sqlite'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0, help='size relative to the 2018 extract (1, 10, 100...)')
+    parser.add_argument('--output', type=Path, help='defaults to benchmarks/data/prouni_<scale>x.sqlite')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    output = args.output or default_path(args.scale)
+    start = time.perf_counter()
+    counts = generate(output, args.scale, args.seed)
+    print(
+        f"{output}: {counts['table1']} rows in table1, {counts['table2']} in table2 "
+        f"({time.perf_counter() - start:.1f} s)"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""Times the ETL, the filtered loads, the metrics and the chart data on synthetic data.
+
+The raw database of each scale is generated by `generate_dataset.py` when
+missing, then cleaned by the ETL into a temporary directory. Every other
+case is timed over a matrix of filter combinations, with the process-wide
+caches cleared before each call, so the times are those of a first
+request. Results are written as JSON to compare runs.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--scales 1 10] [--repeat 3]
+                                        [--backends sqlite parquet] [--output results.json]
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pandas as pd
+
+from generate_dataset import default_path, generate
+from src import columnar, figures
+from src.aggregates import CHART_AGGREGATES, box_statistics, density_bins, get_chart_data, get_metrics, outlier_positions
+from src.dataset import SCHOLARSHIP_COLUMNS, Dataset
+from src.etl import run as run_etl
+from src.query_engine import get_query_engine
+from src.utils import BACKENDS, load_data_with_join
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+def filter_matrix(dataset):
+    """Builds the filter combinations to time, from the most frequent values.
+
+    Args:
+        dataset (Dataset): The unfiltered dataset.
+
+    Returns:
+        dict: The name of each combination mapped to its filters.
+    """
+    facets = dataset.facets()
+
+    def top(column, n=1):
+        return facets[column].nlargest(n, 'registros')['valor'].astype(str).tolist()
+
+    return {
+        'no filters': {},
+        'state': {'uf': top('uf')},
+        'state + degree': {'uf': top('uf'), 'grau': top('grau')},
+        '3 states + shift': {'uf': top('uf', 3), 'turno': top('turno')},
+        'course': {'curso_busca': top('curso_busca')},
+        'university': {'universidade_nome': top('universidade_nome')},
+        'course + university + state': {
+            'curso_busca': top('curso_busca'), 'universidade_nome': top('universidade_nome'), 'uf': top('uf'),
+        },
+    }
+
+
+def clear_caches(db_path):
+    """Empties every process-wide cache, so the next call does the full work."""
+    get_query_engine(db_path).cache.clear()
+    columnar.clear_cache()
+    figures.clear_figure_cache()
+
+
+def measure(func, repeat, before=None):
+    """Times `repeat` calls to `func`, calling `before` untimed ahead of each one.
+
+    Returns:
+        dict: Every time, plus the best and the median, in seconds.
+    """
+    seconds = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return {'seconds': seconds, 'best': min(seconds), 'median': statistics.median(seconds)}
+
+
+def chart_preparation(rows):
+    """Prepares the data of the charts that plot individual courses."""
+    totals = rows[SCHOLARSHIP_COLUMNS].sum(axis=1)
+    box_statistics(rows, 'período', 'mensalidade')
+    density_bins(rows['mensalidade'], totals, rows['nível'])
+    outlier_positions(rows['mensalidade'], totals)
+
+
+def bench_scale(scale, workdir, repeat, backends):
+    """Runs every case on one scale.
+
+    Returns:
+        dict: The sizes of the data and the list of timed cases.
+    """
+    source = default_path(scale)
+    if not source.exists():
+        print(f"Generating {source}...")
+        generate(source, scale)
+    target = Path(workdir) / f'clean_prouni_{scale:g}x.sqlite'
+    results = []
+
+    def record(group, name, timing, **extra):
+        results.append({'group': group, 'name': name, **extra, **timing})
+        print(f"  {group:<10}{name:<50}{timing['best'] * 1000:>10.1f} ms")
+
+    print(f"Scale {scale:g}x")
+    etl = run_etl(source, target, force=True)
+    total = etl['timings']['total']
+    record('etl', 'full load', {'seconds': [total], 'best': total, 'median': total}, stages=etl['timings'])
+
+    dataset = Dataset(load_data_with_join(target))
+    matrix = filter_matrix(dataset)
+    reset = lambda: clear_caches(target)
+
+    for backend in backends:
+        for name, filters in matrix.items():
+            record('load', f'{backend}: {name}',
+                   measure(lambda: load_data_with_join(target, filters, backend), repeat, reset),
+                   filters=filters)
+
+    record('dataset', 'index', measure(lambda: Dataset(dataset.frame), repeat))
+    for name, filters in matrix.items():
+        fresh = lambda: dataset.cache.clear()
+        record('dataset', f'select: {name}', measure(lambda: dataset.select(filters), repeat, fresh), filters=filters)
+        record('dataset', f'facets: {name}', measure(lambda: dataset.facets(filters), repeat, fresh), filters=filters)
+
+    for name, filters in matrix.items():
+        record('metrics', name, measure(lambda: get_metrics(target, filters), repeat, reset), filters=filters)
+        for aggregate in CHART_AGGREGATES:
+            record('charts', f'{aggregate}: {name}',
+                   measure(lambda: get_chart_data(target, aggregate, filters), repeat, reset), filters=filters)
+        rows = dataset.view(dataset.select(filters))
+        record('charts', f'courses: {name}', measure(lambda: chart_preparation(rows), repeat),
+               filters=filters, rows=len(rows))
+
+    return {
+        'scale': scale,
+        'rows': {table: stats['inserted'] for table, stats in etl.items() if table != 'timings'},
+        'joined_rows': len(dataset),
+        'results': results,
+    }
+
+
+def git_revision():
+    """Returns the current commit of the repository, if any."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0], help='sizes relative to the 2018 extract')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--output', type=Path, help='defaults to benchmarks/results/<timestamp>.json')
+    args = parser.parse_args(argv)
+
+    started = datetime.now(timezone.utc)
+    report = {
+        'started': started.isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'versions': {'numpy': np.__version__, 'pandas': pd.__version__},
+        'repeat': args.repeat,
+        'scales': [],
+    }
+    with tempfile.TemporaryDirectory(prefix='prouni_bench_') as workdir:
+        for scale in args.scales:
+            report['scales'].append(bench_scale(scale, workdir, args.repeat, args.backends))
+
+    output = args.output or RESULTS_DIR / f"{started:%Y%m%dT%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+import numpy as np
+import pandas as pd
+from src.instrumentation import span
+from src.query_engine import get_query_engine, normalize_filters
+from src.utils import build_where_clause
+
+CUBE_TABLE = 'cubo_bolsas'
+
+TOTAL_SCHOLARSHIPS = (
+    "SUM(bolsa_integral_cotas + bolsa_parcial_cotas + bolsa_integral_ampla + bolsa_parcial_ampla)"
+)
+
+# Aggregates behind each chart of the dashboard, computed over the cube.
+# `dimensions` and `measures` map the output column names to SQL
+# expressions; measures must be sums, so the aggregates of several year
+# partitions can be added up. `ratios` (output column -> numerator and
+# denominator measures, which are then dropped), `order_by` (columns and
+# whether ascending) and `limit` are optional and applied after merging.
+CHART_AGGREGATES = {
+    'ranking_universidades': {
+        'dimensions': {'universidade': 'universidade_nome'},
+        'measures': {'total_bolsas': TOTAL_SCHOLARSHIPS},
+        'order_by': [('total_bolsas', False), ('universidade', True)],
+        'limit': 10,
+    },
+    'ranking_cursos': {
+        'dimensions': {'curso': 'curso_busca'},
+        'measures': {'total_bolsas': TOTAL_SCHOLARSHIPS},
+        'order_by': [('total_bolsas', False), ('curso', True)],
+        'limit': 10,
+    },
+    'bolsas_por_nivel': {
+        'dimensions': {'nível': 'grau'},
+        'measures': {'total_bolsas': TOTAL_SCHOLARSHIPS},
+        'order_by': [('nível', True)],
+    },
+    'bolsas_por_estado': {
+        'dimensions': {'estado': 'uf'},
+        'measures': {
+            'bolsa_integral_cotas': 'SUM(bolsa_integral_cotas)',
+            'bolsa_parcial_cotas': 'SUM(bolsa_parcial_cotas)',
+            'bolsa_integral': 'SUM(bolsa_integral_ampla)',
+            'bolsa_parcial': 'SUM(bolsa_parcial_ampla)',
+        },
+        'order_by': [('estado', True)],
+    },
+    'mensalidade_media_por_estado': {
+        'dimensions': {'estado': 'uf'},
+        'measures': {
+            'soma_mensalidade': 'SUM(soma_mensalidade)',
+            'mensalidades': 'SUM(mensalidades)',
+        },
+        # missing (no fee informed in the state) when the divisor is zero
+        'ratios': {'mensalidade': ('soma_mensalidade', 'mensalidades')},
+        'order_by': [('estado', True)],
+    },
+}
+
+
+def _partition_paths(db_path):
+    """Returns the databases to query: one path, or the paths of several partitions."""
+    if isinstance(db_path, (list, tuple)):
+        return list(db_path)
+    return [db_path]
+
+
+def _read_cube(db_path, name, query, filters):
+    """Runs a query over the aggregate cube, cached by query name and filters.
+
+    `query` is formatted with the WHERE clause of the filters under the
+    `{where}` placeholder.
+    """
+    where_clause, params = build_where_clause(filters)
+    engine = get_query_engine(db_path)
+    return engine.read_frame(
+        query.format(table=CUBE_TABLE, where=where_clause), params,
+        key=(name, normalize_filters(filters))
+    )
+
+
+def _read_partitions(db_path, name, query, filters):
+    """Runs a cube query on every partition, each with its own cache entry."""
+    paths = _partition_paths(db_path)
+    with span('partitions', query=name, partitions=len(paths)):
+        return [_read_cube(path, name, query, filters) for path in paths]
+
+
+def _non_empty(frames):
+    """Leaves out the partials of partitions without matching rows.
+
+    An empty partial has no values to decide the dtypes of its columns, so
+    it is dropped before concatenating instead of being left to pandas.
+
+    Returns:
+        list: The non-empty frames, or the first frame, empty but with the
+              columns of the partials, when every one is empty.
+    """
+    return [frame for frame in frames if not frame.empty] or frames[:1]
+
+
+def merge_partials(frames, by, sums=None):
+    """Merges the partial aggregates of several partitions.
+
+    Args:
+        frames (list): The partial aggregates, one DataFrame per partition,
+                       with the same columns.
+        by (list): The group columns.
+        sums (list, optional): The columns to add up. Defaults to every
+                               column outside `by`.
+
+    Returns:
+        pd.DataFrame: One row per group. A single non-empty frame is returned
+                      as is, so it must be treated as read-only.
+    """
+    frames = _non_empty(frames)
+    if len(frames) == 1:
+        return frames[0]
+    data = pd.concat(frames, ignore_index=True)
+    sums = sums if sums is not None else [column for column in data.columns if column not in by]
+    return data.groupby(by, as_index=False, sort=False, dropna=False)[sums].sum()
+
+
+def build_aggregate_query(spec):
+    """Builds the GROUP BY query of a chart aggregate, for one partition.
+
+    Args:
+        spec (dict): An entry of `CHART_AGGREGATES`.
+
+    Returns:
+        str: The query, with `{table}` and `{where}` placeholders.
+    """
+    dimensions = spec['dimensions']
+    select = [f'{expression} AS "{alias}"' for alias, expression in dimensions.items()]
+    select += [f'{expression} AS "{alias}"' for alias, expression in spec['measures'].items()]
+    return f"SELECT {', '.join(select)} FROM {{table}}{{where}} GROUP BY {', '.join(dimensions.values())}"
+
+
+def get_chart_data(db_path, name, filters=None):
+    """Computes the aggregate behind a chart directly in SQLite.
+
+    Only the aggregated rows are transferred to pandas, so the cost does not
+    depend on how many records match the filters. With several year
+    partitions, each one is aggregated on its own and the sums are merged,
+    before the ratios, the order and the limit are applied.
+
+    Args:
+        db_path (str, Path or list): The path to the SQLite database, or the
+                                     paths of the partitions to combine.
+        name (str): The name of the aggregate in `CHART_AGGREGATES`.
+        filters (dict, optional): The active filters, as returned by `show_sidebar`.
+
+    Returns:
+        pd.DataFrame: One row per group, with the dimension and measure
+                      columns of the aggregate.
+
+    Raises:
+        KeyError: If `name` is not a known aggregate.
+    """
+    spec = CHART_AGGREGATES[name]
+    frames = _read_partitions(db_path, name, build_aggregate_query(spec), filters)
+    data = merge_partials(frames, list(spec['dimensions']))
+
+    ratios = spec.get('ratios', {})
+    if ratios:
+        data = data.assign(**{
+            alias: (data[numerator] / data[denominator]).where(data[denominator] > 0)
+            for alias, (numerator, denominator) in ratios.items()
+        }).drop(columns=[column for pair in ratios.values() for column in pair])
+    if spec.get('order_by'):
+        columns, ascending = zip(*spec['order_by'])
+        data = data.sort_values(list(columns), ascending=list(ascending), kind='stable')
+    if spec.get('limit'):
+        data = data.head(int(spec['limit']))
+    return data.reset_index(drop=True)
+
+
+def get_metrics(db_path, filters=None):
+    """Computes the headline metrics of the dashboard from the aggregate cube.
+
+    With several year partitions, the totals of each one are combined:
+    sums are added, the fee range is the widest one, courses and
+    universities are counted once across years and the most frequent
+    values are taken from the merged counts.
+
+    Args:
+        db_path (str, Path or list): The path to the SQLite database, or the
+                                     paths of the partitions to combine.
+        filters (dict, optional): The active filters, as returned by `show_sidebar`.
+
+    Returns:
+        dict: The number of courses and universities, the minimum and
+              maximum fee, the most frequent course and state, the
+              scholarships for quotas and the open-competition scholarships.
+    """
+    partials = _read_partitions(db_path, 'metrics', """
+        SELECT
+            COUNT(DISTINCT curso_busca) AS total_cursos,
+            COUNT(DISTINCT universidade_nome) AS total_universidades,
+            MIN(mensalidade_min) AS mensalidade_min,
+            MAX(mensalidade_max) AS mensalidade_max,
+            SUM(bolsa_integral_cotas + bolsa_parcial_cotas) AS total_bolsas_cotas,
+            SUM(bolsa_integral_ampla + bolsa_parcial_ampla) AS total_bolsas_ampla
+        FROM {table}{where}
+    """, filters)
+    if len(partials) == 1:
+        # column by column, so the counts are not upcast to the float of the fees
+        totals = {column: values.iloc[0] for column, values in partials[0].items()}
+    else:
+        # a partition without matching rows has no courses and NULL totals
+        matched = [partial[partial['total_cursos'] > 0] for partial in partials]
+        data = pd.concat(_non_empty(matched), ignore_index=True)
+        totals = {
+            'mensalidade_min': data['mensalidade_min'].min(),
+            'mensalidade_max': data['mensalidade_max'].max(),
+            'total_bolsas_cotas': data['total_bolsas_cotas'].sum(),
+            'total_bolsas_ampla': data['total_bolsas_ampla'].sum(),
+        }
+        # the same course is offered in several years: count it once
+        for column, name in (('curso_busca', 'total_cursos'), ('universidade_nome', 'total_universidades')):
+            values = _read_partitions(db_path, f'distinct_{column}', f"""
+                SELECT DISTINCT {column} AS valor FROM {{table}}{{where}}
+            """, filters)
+            totals[name] = pd.concat(_non_empty(values), ignore_index=True)['valor'].dropna().nunique()
+
+    # a single partition only needs its first group
+    limit = 'LIMIT 1' if len(partials) == 1 else ''
+    for column, name in (('curso_busca', 'curso_mais_frequente'), ('uf', 'estado_mais_frequente')):
+        counts = merge_partials(_read_partitions(db_path, f'most_frequent_{column}', f"""
+            SELECT {column} AS valor, SUM(linhas) AS linhas
+            FROM {{table}}{{where}}
+            GROUP BY {column}
+            ORDER BY SUM(linhas) DESC, {column}
+            {limit}
+        """, filters), ['valor'])
+        most_frequent = counts.sort_values(['linhas', 'valor'], ascending=[False, True], kind='stable')
+        totals[name] = most_frequent['valor'].iloc[0] if not most_frequent.empty else None
+
+    return totals
+
+
+def box_statistics(df, by, value):
+    """Computes the statistics drawn by a box plot, per group.
+
+    Plotly draws boxes from precomputed statistics without receiving the
+    values themselves. Fences follow Plotly's own rule: the most extreme
+    values within 1.5 IQR of the quartiles.
+
+    Args:
+        df (pd.DataFrame): The rows to summarize.
+        by (str): The column to group by.
+        value (str): The numeric column to summarize.
+
+    Returns:
+        pd.DataFrame: One row per group, with `q1`, `median`, `q3`,
+                      `lowerfence`, `upperfence` and `count`, without
+                      groups that have no values.
+    """
+    data = df[[by, value]].dropna()
+    grouped = data.groupby(by, observed=True)[value]
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    iqr = stats['q3'] - stats['q1']
+
+    lower = data[by].map(stats['q1'] - 1.5 * iqr).astype(float)
+    upper = data[by].map(stats['q3'] + 1.5 * iqr).astype(float)
+    inside = data[(data[value] >= lower) & (data[value] <= upper)]
+    inside_grouped = inside.groupby(by, observed=True)[value]
+    stats['lowerfence'] = inside_grouped.min()
+    stats['upperfence'] = inside_grouped.max()
+    stats['count'] = grouped.size()
+    return stats.reset_index()
+
+
+def density_bins(x, y, groups, bins=40):
+    """Bins points on a 2D grid shared by every group.
+
+    Args:
+        x (array-like): The horizontal coordinates.
+        y (array-like): The vertical coordinates.
+        groups (array-like): The group of each point.
+        bins (int, optional): The number of bins on each axis.
+
+    Returns:
+        pd.DataFrame: One row per non-empty bin of each group, with the
+                      group, the bin center (`x`, `y`) and the number of
+                      points (`contagem`). Points with a missing
+                      coordinate are ignored.
+    """
+    frame = pd.DataFrame({
+        'grupo': np.asarray(groups),
+        'x': np.asarray(x, dtype=float),
+        'y': np.asarray(y, dtype=float),
+    }).dropna()
+    if frame.empty:
+        return pd.DataFrame(columns=['grupo', 'x', 'y', 'contagem'])
+
+    x_edges = np.histogram_bin_edges(frame['x'], bins=bins)
+    y_edges = np.histogram_bin_edges(frame['y'], bins=bins)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+
+    binned = []
+    for group, points in frame.groupby('grupo', observed=True, sort=True):
+        counts, _, _ = np.histogram2d(points['x'], points['y'], bins=[x_edges, y_edges])
+        x_index, y_index = np.nonzero(counts)
+        binned.append(pd.DataFrame({
+            'grupo': group,
+            'x': x_centers[x_index],
+            'y': y_centers[y_index],
+            'contagem': counts[x_index, y_index].astype(np.int64),
+        }))
+    return pd.concat(binned, ignore_index=True)
+
+
+def outlier_positions(x, y, limit=200):
+    """Finds the points farthest from the bulk of the data.
+
+    Distances are measured in interquartile ranges from the median on each
+    axis, so both axes weigh the same whatever their units.
+
+    Args:
+        x (array-like): The horizontal coordinates.
+        y (array-like): The vertical coordinates.
+        limit (int, optional): The maximum number of points to return.
+
+    Returns:
+        np.ndarray: The positions of the outliers, farthest first. Points
+                    with a missing coordinate are never returned.
+    """
+    score = np.zeros(len(x))
+    for values in (np.asarray(x, dtype=float), np.asarray(y, dtype=float)):
+        q1, median, q3 = np.nanpercentile(values, [25, 50, 75]) if len(values) else (0, 0, 0)
+        score += np.abs(values - median) / ((q3 - q1) or 1)
+    score = np.where(np.isnan(score), -np.inf, score)
+    order = np.argsort(-score, kind='stable')[:limit]
+    return order[np.isfinite(score[order])]
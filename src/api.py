@@ -0,0 +1,219 @@
+"""Headless JSON API over the same data and aggregates as the dashboard.
+
+Other tools get the facets, metrics, chart aggregates and paginated rows of
+a filter selection without going through Streamlit. The API shares the
+process-wide datasets, query engines and caches, so a selection is computed
+once for every client. Run it with:
+
+    python -m src.api [--host 127.0.0.1] [--port 8600] [--workers 8]
+
+Filters are repeated query parameters named after the filter columns
+(e.g. `?uf=SP&uf=RJ&grau=Bacharelado`) and the years are `ano`; without
+`ano` only the latest year is read, as in the dashboard.
+"""
+import argparse
+import hashlib
+import math
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import numpy as np
+import uvicorn
+from anyio import to_thread
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.aggregates import CHART_AGGREGATES, get_chart_data, get_metrics
+from src.dataset import get_partitioned_dataset
+from src.instrumentation import span
+from src.partitions import DATA_DIR, find_partitions, select_partitions
+
+# Requests are served by a pool of this many threads; the data is shared,
+# so threads rather than processes keep a single copy in memory.
+API_WORKERS = int(os.environ.get('PROUNI_API_WORKERS', 8))
+BACKEND = os.environ.get('PROUNI_BACKEND', 'sqlite')
+# Responses smaller than this are sent uncompressed.
+GZIP_MINIMUM_SIZE = 1024
+MAX_PAGE_SIZE = 1000
+
+
+@asynccontextmanager
+async def _lifespan(app):
+    to_thread.current_default_thread_limiter().total_tokens = app.state.workers
+    yield
+
+
+app = FastAPI(title='API Prouni', lifespan=_lifespan)
+app.state.workers = API_WORKERS
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
+
+def active_filters(
+    curso_busca: list[str] = Query([], description="Cursos"),
+    uf: list[str] = Query([], description="Estados (UF)"),
+    universidade_nome: list[str] = Query([], description="Universidades"),
+    turno: list[str] = Query([], description="Períodos"),
+    grau: list[str] = Query([], description="Graus"),
+):
+    """Reads the filters of the query string, in the format of `show_sidebar`."""
+    filters = {
+        'curso_busca': curso_busca,
+        'uf': uf,
+        'universidade_nome': universidade_nome,
+        'turno': turno,
+        'grau': grau,
+    }
+    return {column: values for column, values in filters.items() if values}
+
+
+def selected_partitions(ano: list[int] = Query([], description="Anos; o mais recente quando omitido")):
+    """Resolves the years of the query string to their partitions.
+
+    Raises:
+        HTTPException: 503 when the ETL has not run, 404 for a year without data.
+    """
+    partitions = find_partitions(DATA_DIR)
+    if not partitions:
+        raise HTTPException(503, "Nenhum banco de dados encontrado. Execute o ETL: python -m src.etl")
+    missing = sorted(set(ano) - set(partitions))
+    if missing:
+        raise HTTPException(404, f"Anos sem dados: {', '.join(map(str, missing))}")
+    return select_partitions(partitions, ano or [max(partitions)])
+
+
+def _plain(value):
+    """Converts numpy scalars and missing values to JSON values."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+def _records(frame):
+    """Converts a DataFrame to a list of JSON objects, with null for missing values."""
+    return [
+        {column: _plain(value) for column, value in row.items()}
+        for row in frame.astype(object).to_dict(orient='records')
+    ]
+
+
+def _etag(request, partitions):
+    """Identifies a response by the request and the files of its partitions.
+
+    Responses are a function of the query and the data only, so the tag is
+    known before computing anything, and it changes whenever the ETL
+    rewrites one of the partitions read.
+    """
+    files = []
+    for path in partitions.values():
+        for source in (path, path.with_suffix('.parquet')):
+            if source.exists():
+                stat = source.stat()
+                files.append((str(source), stat.st_ino, stat.st_mtime_ns, stat.st_size))
+    identity = (request.url.path, sorted(request.query_params.multi_items()), BACKEND, files)
+    return '"' + hashlib.blake2b(repr(identity).encode(), digest_size=16).hexdigest() + '"'
+
+
+def _matches(if_none_match, etag):
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return '*' in tags or etag in tags
+
+
+def _respond(request, partitions, compute):
+    """Answers with `compute()` as JSON, or 304 when the client has it already."""
+    etag = _etag(request, partitions)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if _matches(request.headers.get('if-none-match', ''), etag):
+        return Response(status_code=304, headers=headers)
+    with span('api', path=request.url.path, partitions=len(partitions)):
+        return JSONResponse(compute(), headers=headers)
+
+
+@app.get('/anos')
+def years():
+    """Lists the years with data."""
+    return {'anos': list(find_partitions(DATA_DIR))}
+
+
+@app.get('/facetas')
+def facets(request: Request, partitions=Depends(selected_partitions), filters=Depends(active_filters)):
+    """Lists the available values of every filter column, with their records and scholarships."""
+    def compute():
+        dataset = get_partitioned_dataset(partitions, backend=BACKEND)
+        return {column: _records(facet) for column, facet in dataset.facets(filters).items()}
+    return _respond(request, partitions, compute)
+
+
+@app.get('/metricas')
+def metrics(request: Request, partitions=Depends(selected_partitions), filters=Depends(active_filters)):
+    """Returns the headline metrics of the dashboard and the number of records."""
+    def compute():
+        dataset = get_partitioned_dataset(partitions, backend=BACKEND)
+        totals = get_metrics(list(partitions.values()), filters)
+        return {
+            'anos': list(partitions),
+            'registros': dataset.count(filters),
+            **{name: _plain(value) for name, value in totals.items()},
+        }
+    return _respond(request, partitions, compute)
+
+
+@app.get('/agregados/{nome}')
+def aggregate(
+    nome: str, request: Request, partitions=Depends(selected_partitions), filters=Depends(active_filters),
+):
+    """Returns the aggregate behind a chart, such as `ranking_cursos`."""
+    if nome not in CHART_AGGREGATES:
+        raise HTTPException(404, f"Agregado desconhecido: {nome}. Opções: {', '.join(CHART_AGGREGATES)}")
+
+    def compute():
+        data = get_chart_data(list(partitions.values()), nome, filters)
+        return {'anos': list(partitions), 'nome': nome, 'linhas': _records(data)}
+    return _respond(request, partitions, compute)
+
+
+@app.get('/registros')
+def records(
+    request: Request,
+    partitions=Depends(selected_partitions),
+    filters=Depends(active_filters),
+    pagina: int = Query(1, ge=1),
+    tamanho: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    ordenar: str | None = Query(None, description="Coluna usada na ordenação"),
+    decrescente: bool = False,
+):
+    """Returns one page of the filtered records, optionally sorted."""
+    def compute():
+        dataset = get_partitioned_dataset(partitions, backend=BACKEND)
+        if ordenar is not None and ordenar not in dataset.frame.columns:
+            raise HTTPException(400, f"Coluna desconhecida: {ordenar}")
+        page = dataset.page(filters, page=pagina, page_size=tamanho, sort_by=ordenar, descending=decrescente)
+        return {
+            'anos': list(partitions),
+            'registros': dataset.count(filters),
+            'pagina': pagina,
+            'tamanho': tamanho,
+            'linhas': _records(page),
+        }
+    return _respond(request, partitions, compute)
+
+
+def main(argv=None):
+    """Command-line entry point that serves the API."""
+    parser = argparse.ArgumentParser(description='Serve a API JSON dos dados do Prouni.')
+    parser.add_argument('--host', default='127.0.0.1', help='endereço de escuta')
+    parser.add_argument('--port', type=int, default=8600, help='porta de escuta')
+    parser.add_argument('--workers', type=int, default=API_WORKERS, help='threads que atendem as requisições')
+    args = parser.parse_args(argv)
+    app.state.workers = args.workers
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
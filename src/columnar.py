@@ -0,0 +1,177 @@
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.instrumentation import span
+from src.query_engine import ResultCache, normalize_filters
+
+# Rows per Parquet row group. Each group keeps min/max statistics, so
+# filters on the sort columns skip whole groups without decoding them.
+ROW_GROUP_SIZE = 64 * 1024
+
+# SQLite declared type -> Arrow type. Text columns are dictionary-encoded:
+# the filter columns have a few hundred distinct values at most.
+ARROW_TYPES = {
+    'INT': pa.int64(),
+    'INTEGER': pa.int64(),
+    'REAL': pa.float64(),
+    'TEXT': pa.dictionary(pa.int32(), pa.string()),
+}
+
+
+def arrow_schema(conn, table):
+    """Builds the Arrow schema of a SQLite table from its declared types.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+        table (str): The table name.
+
+    Returns:
+        pa.Schema: The schema, with text columns dictionary-encoded.
+    """
+    columns = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+    return pa.schema([
+        pa.field(name, ARROW_TYPES.get(declared.upper(), pa.string()))
+        for _, name, declared, *_ in columns
+    ])
+
+
+def export_table(conn, table, path, sort_by=(), chunksize=50_000):
+    """Writes a SQLite table to a Parquet file, streaming it in chunks.
+
+    The file is written next to `path` and moved into place at the end, so
+    readers never see a partial file.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the database.
+        table (str): The table to export.
+        path (str or Path): The Parquet file to write.
+        sort_by (list, optional): The columns to sort the rows by, so row
+                                  group statistics can prune filtered reads.
+        chunksize (int, optional): The number of rows read at a time.
+
+    Returns:
+        int: The number of rows written.
+    """
+    path = Path(path)
+    schema = arrow_schema(conn, table)
+    integer_columns = {field.name: 'Int64' for field in schema if pa.types.is_integer(field.type)}
+    query = f'SELECT * FROM "{table}"'
+    if sort_by:
+        query += f" ORDER BY {', '.join(sort_by)}"
+
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    rows = 0
+    with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+        for chunk in pd.read_sql_query(query, conn, chunksize=chunksize, dtype=integer_columns):
+            writer.write_table(
+                pa.Table.from_pandas(chunk, schema=schema, preserve_index=False),
+                row_group_size=ROW_GROUP_SIZE,
+            )
+            rows += len(chunk)
+    os.replace(tmp_path, path)
+    return rows
+
+
+def build_filter_expression(filters):
+    """Builds the Arrow predicate equivalent to `build_where_clause`.
+
+    List values become `isin` and any other value becomes a case-insensitive
+    substring match, like SQLite's `LIKE '%value%'`.
+
+    Args:
+        filters (dict or None): A dictionary of column names to the values
+                                to filter.
+
+    Returns:
+        pyarrow.dataset.Expression or None: The predicate, or None if there
+                                            is nothing to filter.
+    """
+    expression = None
+    for column, value in (filters or {}).items():
+        if not value:
+            continue
+        if isinstance(value, list):
+            condition = ds.field(column).isin(value)
+        else:
+            # substring kernels do not accept dictionary arrays, so decode first
+            text = ds.field(column).cast(pa.string())
+            condition = pc.match_substring(text, str(value), ignore_case=True)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+_cache = ResultCache()
+
+
+def read_table(path, filters=None, columns=None, dtype=None):
+    """Reads a filtered projection of a Parquet file as a DataFrame.
+
+    The file is memory-mapped and the filters are pushed down to the Parquet
+    reader, which skips row groups by their statistics and evaluates the
+    predicate on the encoded columns. Text columns come back as categoricals
+    backed by the dictionary of the file, with their categories sorted. Results are cached per process,
+    keyed by the file modification time, like the SQLite query engine.
+
+    Args:
+        path (str or Path): The Parquet file.
+        filters (dict, optional): A dictionary of column names to the values
+                                  to filter.
+        columns (dict, optional): The columns to read, mapped to the names
+                                  they get in the result. Defaults to all.
+        dtype (dict, optional): The dtypes to apply to the result columns,
+                                by their names in the result.
+
+    Returns:
+        pd.DataFrame: The filtered rows. The frame may be shared with other
+                      sessions and must not be modified in place.
+    """
+    path = Path(path)
+    stat = os.stat(path)
+    cache_key = (
+        str(path.resolve()), stat.st_mtime_ns, stat.st_size,
+        tuple(columns.items()) if columns else None, normalize_filters(filters),
+        tuple(sorted(dtype.items())) if dtype else None,
+    )
+    with span('parquet.read', file=path.name, filters=cache_key[4]) as read_span:
+        cached = _cache.get(cache_key)
+        if cached is not None:
+            read_span.set(rows=len(cached), cached=True)
+            return cached
+
+        table = pq.read_table(
+            path,
+            columns=list(columns) if columns else None,
+            filters=build_filter_expression(filters),
+            memory_map=True,
+        )
+        df = table.to_pandas()
+        if columns:
+            df = df.rename(columns=columns)
+        if dtype:
+            df = df.astype({column: kind for column, kind in dtype.items() if column in df.columns})
+        for column, values in df.items():
+            # the file dictionary keeps the order values were first written;
+            # sort it, as SQLite's categories are, so codes sort like the values
+            if isinstance(values.dtype, pd.CategoricalDtype) and not values.cat.categories.is_monotonic_increasing:
+                df[column] = values.cat.reorder_categories(values.cat.categories.sort_values())
+
+        size = int(df.memory_usage(deep=True).sum())
+        read_span.set(rows=len(df), bytes=size, file_bytes=table.nbytes, cached=False)
+        _cache.put(cache_key, df, size)
+        return df
+
+
+def cache_stats():
+    """Returns the counters of the cache of Parquet reads."""
+    return _cache.stats()
+
+
+def clear_cache():
+    """Drops every cached Parquet read, keeping the counters."""
+    _cache.clear()
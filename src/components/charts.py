@@ -1,128 +1,88 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import requests
-import textwrap
+import os
+from functools import partial
 
-def show_charts(df_filtred: pd.DataFrame):
+import streamlit as st
+from src.aggregates import get_chart_data
+from src.components.sections import section
+from src.figures import (
+    build_box_figure, build_level_figure, build_ranking_figure, build_scatter_figure,
+    build_state_bars_figure, build_states_map_figure, build_sunburst_figure,
+    cached_figure, data_digest,
+)
+from src.geo import load_brazil_states
+from src.instrumentation import span
+from src.query_engine import normalize_filters
+from src.utils import replace_comma_with_dot
+
+# Above this many courses the scatter plot is drawn as a binned density,
+# keeping exact points only for the outliers.
+SCATTER_MAX_POINTS = int(os.environ.get('PROUNI_SCATTER_MAX_POINTS', 5000))
+SCATTER_BINS = 40
+SCATTER_OUTLIERS = 200
+
+def _plot(name, fig):
+    """Sends a figure to the browser, timing its serialization."""
+    with span('figure.render', chart=name):
+        st.plotly_chart(fig, use_container_width=True)
+
+@section("Gráficos")
+def show_charts(dataset, db_path, filters=None):
     """
     Displays all dashboard charts.
 
+    Figures are built once per input and shared through the figure cache:
+    the aggregated charts are keyed by a digest of their aggregate, and the
+    charts that plot individual courses by the filters and the dataset
+    version, so their rows are only taken from the dataset on a miss.
+
     Args:
-        df_filtred (pd.DataFrame): The filtered DataFrame with the data to be displayed.
+        dataset (Dataset): The shared dataset of the selected years.
+        db_path (str, Path or list): The path to the SQLite database, or the
+                                     paths of the selected year partitions,
+                                     from which the aggregated charts are
+                                     computed.
+        filters (dict, optional): The active filters of the sidebar.
     """
     #  ------ grafics ------
 
-    PRIMARY_COLOR = "#0F90DB"  
-    SECONDARY_COLOR = "#AE25EE"
-    THIRD_COLOR = "#06CA96"  
-    ORANGE_COLOR = "#FF7C25"
-    YELLOW_COLOR = "#FFD82C"
-    GRAY_COLOR = '#999999'
-    SCHOLARSHIP_TYPE_COLOR = {'Bolsas para Cotas': SECONDARY_COLOR, 'Ampla Concorrência': PRIMARY_COLOR}
-    SCALE_COLOR_MAP = 'Blues'
-    CATEGORIES_COLORS = [PRIMARY_COLOR, SECONDARY_COLOR, THIRD_COLOR, ORANGE_COLOR, YELLOW_COLOR, GRAY_COLOR]
+    filters_key = normalize_filters(filters)
+    rows_key = (filters_key, dataset.version)
+
+    def filtered_rows():
+        return dataset.view(dataset.select(filters))
+
+    def aggregate_figure(name, build, *aggregates):
+        return cached_figure(name, data_digest(*aggregates), partial(build, *aggregates))
 
     graphic1, graphic2 = st.columns(2)
-    df_graphics_ranking = df_filtred.copy()
 
     with graphic1:
-        columns_to_sum = [
-            'bolsa_integral_cotas',
-            'bolsa_parcial_cotas',
-            'bolsa_integral',
-            'bolsa_parcial'
-        ]
-        df_graphics_ranking['total_bolsas'] = df_graphics_ranking[columns_to_sum].sum(axis=1)
-
-        ranking_schools = df_graphics_ranking.groupby('universidade')['total_bolsas'].sum().nlargest(10).sort_values(ascending=True)
-
-        if not ranking_schools.empty:
-            
-            formatted_labels = ['<br>'.join(textwrap.wrap(label, 40)) for label in ranking_schools.index]
-
-            max_value = ranking_schools.max()
-            text_positions = []
-            text_font_colors = []
-            for value in ranking_schools:
-                if value < max_value * 0.30:
-                    text_positions.append('outside')
-                    text_font_colors.append(GRAY_COLOR)
-                else:
-                    text_positions.append('inside')
-                    text_font_colors.append('white')
-
-            fig_ranking_schools = px.bar(
-                x=ranking_schools.values, 
-                y=formatted_labels,   
-                orientation='h',
-                labels={'x': 'Total de Bolsas', 'y': 'Universidade'},
-                text=ranking_schools.values,
-                color_discrete_sequence=[PRIMARY_COLOR]
-            )
-
-            fig_ranking_schools.update_traces(
-                hovertemplate='<b>Universidade:</b> %{customdata}<br><b>Total de Bolsas:</b> %{x:,.0f}<extra></extra>',
-                customdata=ranking_schools.index, 
-                texttemplate='%{x:,.0f}',
-                textposition=text_positions,
-                textfont_color=text_font_colors
-            )
-
-            fig_ranking_schools.update_layout(
-                title_text="Top 10 Universidades por Total de Bolsas",
-                title_x=0.5,
-                title_xanchor="center",
-                margin=dict(l=150, r=50, t=50, b=50)
-            )
-
-            st.plotly_chart(fig_ranking_schools, use_container_width=True)
+        ranking_schools = get_chart_data(db_path, 'ranking_universidades', filters)
+        fig_ranking_schools = cached_figure(
+            'ranking_universidades', data_digest(ranking_schools),
+            lambda: build_ranking_figure(
+                ranking_schools.set_index('universidade')['total_bolsas'], 'Universidade',
+                "Top 10 Universidades por Total de Bolsas", wrap_width=40, outside_ratio=0.30,
+            ),
+        )
+
+        if fig_ranking_schools is not None:
+            _plot('ranking_universidades', fig_ranking_schools)
         else:
             st.warning("Nenhum dado de universidade para exibir com os filtros atuais.")
 
     with graphic2:
+        ranking_courses = get_chart_data(db_path, 'ranking_cursos', filters)
+        fig_ranking_courses = cached_figure(
+            'ranking_cursos', data_digest(ranking_courses),
+            lambda: build_ranking_figure(
+                ranking_courses.set_index('curso')['total_bolsas'], 'Curso',
+                "Top 10 Cursos por Total de Bolsas", wrap_width=30, outside_ratio=0.25,
+            ),
+        )
 
-        ranking_courses = df_graphics_ranking.groupby('curso')['total_bolsas'].sum().nlargest(10).sort_values(ascending=True)
-
-        if not ranking_courses.empty:
-  
-            formatted_labels_courses = ['<br>'.join(textwrap.wrap(label, 30)) for label in ranking_courses.index]
-            
-            max_value_courses = ranking_courses.max()
-            text_positions_courses = []
-            text_font_colors_courses = []
-            for value in ranking_courses:
-                if value < max_value_courses * 0.25:
-                    text_positions_courses.append('outside')
-                    text_font_colors_courses.append(GRAY_COLOR)
-                else:
-                    text_positions_courses.append('inside')
-                    text_font_colors_courses.append('white')
-
-            fig_ranking_courses = px.bar(
-                x=ranking_courses.values,
-                y=formatted_labels_courses,
-                orientation='h',
-                labels={'x': 'Total de Bolsas', 'y': 'Curso'},
-                text=ranking_courses.values,
-                color_discrete_sequence=[PRIMARY_COLOR]
-            )
-
-            fig_ranking_courses.update_traces(
-                hovertemplate='<b>Curso:</b> %{customdata}<br><b>Total de Bolsas:</b> %{x:,.0f}<extra></extra>',
-                customdata=ranking_courses.index,
-                texttemplate='%{x:,.0f}',
-                textposition=text_positions_courses,
-                textfont_color=text_font_colors_courses
-            )
-
-            fig_ranking_courses.update_layout(
-                title_text="Top 10 Cursos por Total de Bolsas",
-                title_x=0.5,
-                title_xanchor="center",
-                margin=dict(l=150, r=50, t=50, b=50)
-            )
-            st.plotly_chart(fig_ranking_courses, use_container_width=True)
+        if fig_ranking_courses is not None:
+            _plot('ranking_cursos', fig_ranking_courses)
         else:
             st.warning("Nenhum dado de curso para exibir com os filtros atuais.")
 
@@ -131,197 +91,80 @@ def show_charts(df_filtred: pd.DataFrame):
     st.subheader("Distribuição de Mensalidades por período")
     st.info("Períodos de ensino influenciam no preço?")
 
-    if 'mensalidade' in df_filtred.columns and 'período' in df_filtred.columns:
-        fig_monthy_fee = px.box(df_filtred,
-                    x='período', 
-                    y='mensalidade', 
-                    color='período',
-                    labels={'mensalidade': 'Mensalidade (R$)', 'período': 'período do Curso'},
-                    color_discrete_sequence=CATEGORIES_COLORS
-                    )
-        st.plotly_chart(fig_monthy_fee, use_container_width=True)
+    if 'mensalidade' in dataset.frame.columns and 'período' in dataset.frame.columns:
+        fig_monthy_fee = cached_figure('mensalidade_por_periodo', rows_key, lambda: build_box_figure(filtered_rows()))
+        _plot('mensalidade_por_periodo', fig_monthy_fee)
 
     st.markdown("---")
 
     st.subheader("Relação entre Mensalidade e Número de Bolsas")
     st.info("Cursos mais caros oferecem mais ou menos bolsas?")
 
-    df_scatter = df_graphics_ranking.copy()
-
-    fig_scatter = px.scatter(
-            df_scatter,
-            x='mensalidade',
-            y='total_bolsas',
-            color='nível', 
-            labels={'mensalidade': 'Valor da Mensalidade (R$)', 'total_bolsas': 'Nº Total de Bolsas'},
-            hover_data=['universidade', 'curso', 'nível'],
-            color_discrete_sequence=CATEGORIES_COLORS
+    if dataset.count(filters) > SCATTER_MAX_POINTS:
+        st.caption(
+            f"Com mais de {replace_comma_with_dot(SCATTER_MAX_POINTS)} cursos, os pontos são agrupados "
+            f"em faixas (o tamanho indica a quantidade de cursos); só os {SCATTER_OUTLIERS} cursos "
+            "mais atípicos aparecem individualmente."
         )
-
-    fig_scatter.update_traces(
-        hovertemplate='<b>%{customdata[0]}</b><br>' +
-                    '<b>Curso:</b> %{customdata[1]}<br>' +
-                    '<b>Nível:</b> %{customdata[2]}<br>' +
-                    '<b>Mensalidade:</b> R$ %{x:,.2f}<br>' +
-                    '<b>Total de Bolsas:</b> %{y:,.0f}<extra></extra>'
+    fig_scatter = cached_figure(
+        'mensalidade_vs_bolsas', (rows_key, SCATTER_MAX_POINTS, SCATTER_BINS, SCATTER_OUTLIERS),
+        lambda: build_scatter_figure(filtered_rows(), SCATTER_MAX_POINTS, SCATTER_BINS, SCATTER_OUTLIERS),
     )
-
-
-    st.plotly_chart(fig_scatter, use_container_width=True)
+    _plot('mensalidade_vs_bolsas', fig_scatter)
 
     st.markdown('---')
 
-    graphic3, graphic4 = st.columns([0.4, 0.6]) 
+    graphic3, graphic4 = st.columns([0.4, 0.6])
 
     with graphic3:
         st.subheader("Proporção de Bolsas por Nível")
         st.info("Qual nível de curso possui mais bolsas?")
-        
-        df_level_copy = df_filtred.copy()
-        columns_to_sum = ['bolsa_integral_cotas', 'bolsa_parcial_cotas', 'bolsa_integral', 'bolsa_parcial']
-        df_level_copy['total_bolsas'] = df_level_copy[columns_to_sum].sum(axis=1)
-
-        df_level_distribution = df_level_copy.groupby('nível')['total_bolsas'].sum().reset_index()
-
-        if not df_level_distribution.empty and df_level_distribution['total_bolsas'].sum() > 0:
-            fig_donut_level = px.pie(
-                df_level_distribution, 
-                names='nível', 
-                values='total_bolsas', 
-                hole=0.3, 
-                color='nível', 
-                color_discrete_sequence=CATEGORIES_COLORS
-            )
-            fig_donut_level.update_traces(
-                textinfo='percent+label',
-                hovertemplate='<b>%{label}</b><br>Quantidade: %{value:,.0f}<br>Percentual: %{percent:.1%}<extra></extra>'
-            )
-            st.plotly_chart(fig_donut_level, use_container_width=True)
+
+        fig_donut_level = aggregate_figure(
+            'bolsas_por_nivel', build_level_figure, get_chart_data(db_path, 'bolsas_por_nivel', filters)
+        )
+        if fig_donut_level is not None:
+            _plot('bolsas_por_nivel', fig_donut_level)
         else:
             st.warning("Não há dados de nível para exibir com os filtros atuais.")
-            
+
     with graphic4:
         st.subheader("Distribuição por Tipo de Bolsa e Estado")
         st.info("Quais tipos de bolsas são mais ofertadas por estado?")
 
-        columns_to_melt = [
-            'bolsa_integral_cotas', 'bolsa_parcial_cotas',
-            'bolsa_integral', 'bolsa_parcial'
-        ]
-
-        df_long_format = pd.melt(
-            df_filtred,
-            id_vars=['estado'],
-            value_vars=columns_to_melt,
-            var_name='tipo_bolsa',
-            value_name='quantidade'
+        # melts the per-state totals (one row per state), not the filtered rows
+        fig_sunburst = aggregate_figure(
+            'bolsas_por_tipo_e_estado', build_sunburst_figure, get_chart_data(db_path, 'bolsas_por_estado', filters)
         )
-
-        scholarship_name_map = {
-            'bolsa_integral_cotas': 'Integral - Cotas',
-            'bolsa_parcial_cotas': 'Parcial - Cotas',
-            'bolsa_integral': 'Integral - Ampla',
-            'bolsa_parcial': 'Parcial - Ampla'
-        }
-        df_long_format['tipo_bolsa'] = df_long_format['tipo_bolsa'].map(scholarship_name_map)
-        df_long_format = df_long_format[df_long_format['quantidade'] > 0]
-
-        if not df_long_format.empty:
-            fig_sunburst = px.sunburst(
-                df_long_format,
-                path=['tipo_bolsa', 'estado'], 
-                values='quantidade',
-                color='tipo_bolsa',
-                color_discrete_sequence=CATEGORIES_COLORS
-            )
-            
-            fig_sunburst.update_traces(
-                textinfo='label+percent parent',
-                hovertemplate='<b>%{label}</b><br>Quantidade: %{value:,.0f}<br>Percentual: %{percentParent:.1%}<extra></extra>'
-            )
-            
-            fig_sunburst.update_layout(
-                legend_title_text='Tipo de Bolsa',
-                showlegend=True,
-            )
-            
-            st.plotly_chart(fig_sunburst, use_container_width=True)
+        if fig_sunburst is not None:
+            _plot('bolsas_por_tipo_e_estado', fig_sunburst)
         else:
             st.warning("Não há dados de bolsas para exibir neste gráfico com os filtros atuais.")
 
     st.markdown('---')
     st.subheader("Distribuição Média de Mensalidades por Estado no Brasil")
     st.info("Qual a média de mensalidade por estado?")
-        
-    average_monthly_per_state = df_filtred.groupby('estado')['mensalidade'].mean().reset_index()
-        
-    geojson_url = 'https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson'
-    response = requests.get(geojson_url)
-    geojson_brasil = response.json()
-
-    fig_states_br = px.choropleth(
-        average_monthly_per_state,
-        geojson=geojson_brasil,
-        locations='estado',
-        featureidkey='properties.sigla',
-        color='mensalidade',
-        color_continuous_scale=SCALE_COLOR_MAP,
-        scope='south america',
-        labels={'mensalidade': 'Mensalidade Média (R$)', 'uf_busca': 'Estado'}
-    )
-
-    fig_states_br.update_geos(
-                visible=False,
-                projection_type="mercator",
-                center={"lat": -14, "lon": -53},
-                fitbounds="locations"
-            )
-    fig_states_br.update_layout(
-        width=1000, 
-        height=800,  
-        margin={"r": 0, "t": 30, "l": 0, "b": 0}
-    )
-    fig_states_br.update_traces(
-        hovertemplate='<b>%{location}</b><br><b>Mensalidade Média:</b> R$ %{z:.2f}<extra></extra>'
-    )
-
-    st.plotly_chart(fig_states_br, use_container_width=True)
 
+    with span('geojson.load'):
+        geojson_brasil = load_brazil_states()
+
+    if geojson_brasil is None:
+        st.warning("Mapa indisponível: gere o arquivo de estados com `python -m src.geo`.")
+    else:
+        average_monthly_per_state = get_chart_data(db_path, 'mensalidade_media_por_estado', filters)
+        # the cached figure holds the GeoJSON, so its id is not reused while cached
+        fig_states_br = cached_figure(
+            'mensalidade_media_por_estado', (data_digest(average_monthly_per_state), id(geojson_brasil)),
+            lambda: build_states_map_figure(average_monthly_per_state, geojson_brasil),
+        )
+        _plot('mensalidade_media_por_estado', fig_states_br)
 
     st.markdown('---')
 
     st.subheader("Quantidade de Bolsas (Cotas vs. Ampla) Ofertadas por Estado")
     st.info("Como foi a distribuição de bolsas por estado?")
 
-    df_bars = df_filtred.copy()
-
-    cols_quotas = ['bolsa_integral_cotas', 'bolsa_parcial_cotas']
-    cols_general = ['bolsa_integral', 'bolsa_parcial']
-
-    df_bars['total_bolsas_cotas'] = df_bars[cols_quotas].sum(axis=1)
-    df_bars['total_bolsas_ampla'] = df_bars[cols_general].sum(axis=1)
-
-    df_groupby = df_bars.groupby('estado')[['total_bolsas_cotas', 'total_bolsas_ampla']].sum().reset_index()
-
-    df_groupby['total_geral'] = df_groupby['total_bolsas_cotas'] + df_groupby['total_bolsas_ampla']
-
-    df_groupby = df_groupby.sort_values(by='total_geral', ascending=False)
-
-    fig_bars = px.bar(
-        df_groupby,
-        x='estado',
-        y=['total_bolsas_cotas', 'total_bolsas_ampla'],
-        title='',
-        labels={'value': 'Quantidade de Bolsas', 'estado': 'Estado', 'variable': 'Tipo de Bolsa'},
-        color_discrete_map={
-            'total_bolsas_cotas': SECONDARY_COLOR,
-            'total_bolsas_ampla': PRIMARY_COLOR
-        }
-    )
-
-    new_names = {'total_bolsas_cotas': 'Bolsas para Cotas', 'total_bolsas_ampla': 'Bolsas - Ampla Concorrência'}
-    fig_bars.for_each_trace(lambda t: t.update(name = new_names[t.name]))
-    fig_bars.update_traces(
-        hovertemplate="<br><b>Estado</b>: %{x}<br><b>Tipo</b>: %{fullData.name}<br><b>Quantidade</b>: %{y:,.0f}<extra></extra>"
+    fig_bars = aggregate_figure(
+        'bolsas_cotas_ampla_por_estado', build_state_bars_figure, get_chart_data(db_path, 'bolsas_por_estado', filters)
     )
-    st.plotly_chart(fig_bars, use_container_width=True)
+    _plot('bolsas_cotas_ampla_por_estado', fig_bars)
@@ -1,20 +1,52 @@
+import math
 import streamlit as st
-import pandas as pd
+from ..utils import replace_comma_with_dot
+from .sections import section
 
-def show_data_table(df_filtred: pd.DataFrame):
+PAGE_SIZES = [50, 100, 500, 1000]
+NO_SORT = 'Ordem original'
+
+@section("Tabela de dados", fragment=True)
+def show_data_table(dataset, filters, record_count):
     """
-    
+
     Displays the data table with pagination.
 
+    Only the rows of the visible page are taken from the shared dataset and
+    sent to the browser; sorting is done by the dataset, over all the
+    filtered rows.
+
     Args:
-        df_filtred (pd.DataFrame): The filtered DataFrame with the data to be displayed.
+        dataset (Dataset): The shared dataset, as returned by `get_dataset`.
+        filters (dict): The active filters of the sidebar.
+        record_count (int): The number of records that match the filters.
     """
-    if not df_filtred.empty:
+    if record_count > 0:
         st.markdown('---')
-        page_size = 10000  
-        page_number = st.number_input("Página", min_value=1, value=1, label_visibility="collapsed", width=130 )
-        start_idx = (page_number - 1) * page_size
-        end_idx = min(start_idx + page_size, len(df_filtred))
-        st.dataframe(df_filtred.iloc[start_idx:end_idx])
+        size_col, sort_col, direction_col, page_col = st.columns([0.15, 0.35, 0.2, 0.3])
+        with size_col:
+            page_size = st.selectbox("Linhas por página", PAGE_SIZES, index=1)
+        with sort_col:
+            sort_by = st.selectbox("Ordenar por", [NO_SORT, *dataset.frame.columns])
+        with direction_col:
+            descending = st.radio(
+                "Ordem", ["Crescente", "Decrescente"], horizontal=True, disabled=sort_by == NO_SORT
+            ) == "Decrescente"
+
+        total_pages = max(1, math.ceil(record_count / page_size))
+        # the filters or page size may have shrunk the number of pages
+        if st.session_state.get('pagina_tabela', 1) > total_pages:
+            st.session_state['pagina_tabela'] = total_pages
+        with page_col:
+            page_number = st.number_input(
+                f"Página (de {replace_comma_with_dot(total_pages)})",
+                min_value=1, max_value=total_pages, key='pagina_tabela',
+            )
+
+        df_page = dataset.page(
+            filters, page=page_number, page_size=page_size,
+            sort_by=None if sort_by == NO_SORT else sort_by, descending=descending,
+        )
+        st.dataframe(df_page)
     else:
         st.warning("Nenhum resultado encontrado para os filtros aplicados.")
@@ -0,0 +1,97 @@
+import pandas as pd
+import streamlit as st
+from ..columnar import cache_stats as parquet_cache_stats
+from ..figures import figure_cache_stats
+from ..instrumentation import ENABLED, log_event
+from ..query_engine import get_query_engine
+from .sections import TIMINGS_KEY
+
+PROFILE_KEY = 'perfilar_execucao'
+PROFILE_REPORT_KEY = 'perfil_execucao'
+
+def profile_requested():
+    """
+    Tells whether the user asked to profile this rerun, clearing the request.
+
+    Returns:
+        bool: True once after the profile button of the debug panel is clicked.
+    """
+    return ENABLED and st.session_state.pop(PROFILE_KEY, False)
+
+def _request_profile():
+    st.session_state[PROFILE_KEY] = True
+
+def _span_table(spans):
+    rows = []
+    for record in spans:
+        attributes = {
+            key: value for key, value in record.items()
+            if key not in ('span', 'depth', 'ms', 'start_ms')
+        }
+        rows.append({
+            'Etapa': ' ' * record['depth'] + record['span'],
+            'Início (ms)': record.get('start_ms'),
+            'Tempo (ms)': record['ms'],
+            'Linhas': attributes.pop('rows', None),
+            'Bytes': attributes.pop('bytes', None),
+            'Cache': attributes.pop('cached', None),
+            'Atributos': ', '.join(f'{key}={value}' for key, value in attributes.items()),
+        })
+    # spans are recorded when they close, so sort them back by start
+    return pd.DataFrame(rows).sort_values('Início (ms)', kind='stable') if rows else pd.DataFrame()
+
+def show_debug_panel(spans, profile, partitions, dataset):
+    """
+    Displays the instrumentation of the last rerun, when `PROUNI_INSTRUMENTATION` is set.
+
+    The panel lists the time of each section and of every span of the rerun,
+    the rows and bytes moved by each query, the hit rate of every cache and
+    the cProfile report of the rerun, when requested.
+
+    Args:
+        spans (list): The spans of the rerun, as collected by `trace`.
+        profile (dict): The result of `profiled` for the rerun.
+        partitions (dict): The path to the SQLite database of each selected year.
+        dataset (Dataset): The shared dataset of the selected years.
+    """
+    if not ENABLED:
+        return
+
+    caches = {
+        **{f'Consultas SQLite ({year})': get_query_engine(path).stats() for year, path in partitions.items()},
+        'Leituras Parquet': parquet_cache_stats(),
+        'Seleções do dataset': dataset.cache.stats(),
+        'Figuras': figure_cache_stats(),
+    }
+    log_event('caches', **caches)
+    if profile:
+        st.session_state[PROFILE_REPORT_KEY] = profile
+
+    with st.expander("Depuração"):
+        timings = st.session_state.get(TIMINGS_KEY, {})
+        st.markdown("**Tempo por seção** (inclui as seções reexecutadas sozinhas)")
+        st.dataframe(
+            pd.DataFrame({
+                'Seção': list(timings),
+                'Tempo (ms)': [round(seconds * 1000, 1) for seconds in timings.values()],
+            }),
+            hide_index=True,
+        )
+
+        st.markdown("**Etapas da última execução completa**")
+        st.dataframe(_span_table(spans), hide_index=True)
+
+        st.markdown("**Caches**")
+        st.dataframe(
+            pd.DataFrame.from_dict(caches, orient='index').assign(
+                hit_rate=lambda df: (df['hit_rate'] * 100).round(1)
+            ).rename(columns={'hit_rate': 'acertos (%)'}),
+        )
+
+        st.button("Perfilar a próxima execução", on_click=_request_profile)
+        report = st.session_state.get(PROFILE_REPORT_KEY)
+        if report is not None:
+            if 'error' in report:
+                st.warning(f"Não foi possível perfilar a execução: {report['error']}")
+            else:
+                st.code(report['report'], language=None)
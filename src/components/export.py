@@ -0,0 +1,53 @@
+import os
+import streamlit as st
+from ..export import EXPORT_FORMATS, export_to_tempfile
+from ..query_engine import normalize_filters
+from ..utils import replace_comma_with_dot
+from .sections import section
+
+FORMAT_LABELS = {
+    'csv': 'CSV',
+    'csv.gz': 'CSV compactado (gzip)',
+    'parquet': 'Parquet',
+}
+
+@section("Exportação", fragment=True)
+def show_export(dataset, filters, record_count):
+    """
+    Displays the export of the filtered records.
+
+    The file is written in chunks to the export directory when the user asks
+    for it, so the filtered rows are never held in memory all at once. The
+    previous file of the session is deleted when a new one is generated, and
+    files left by abandoned sessions are pruned by age and count.
+
+    Args:
+        dataset (Dataset): The shared dataset, as returned by `get_dataset`.
+        filters (dict): The active filters of the sidebar.
+        record_count (int): The number of records that match the filters.
+    """
+    if record_count == 0:
+        return
+
+    format_col, generate_col, download_col = st.columns([0.3, 0.2, 0.5], vertical_alignment='bottom')
+    with format_col:
+        fmt = st.selectbox("Exportar registros filtrados", list(EXPORT_FORMATS), format_func=FORMAT_LABELS.get)
+
+    request = (normalize_filters(filters), fmt)
+    export = st.session_state.get('exportacao')
+
+    with generate_col:
+        if st.button("Gerar arquivo"):
+            if export is not None and os.path.exists(export['path']):
+                os.remove(export['path'])
+            with st.spinner("Gerando arquivo..."):
+                path = export_to_tempfile(dataset, fmt, filters)
+            export = st.session_state['exportacao'] = {'request': request, 'path': path}
+
+    if export is not None and export['request'] == request and os.path.exists(export['path']):
+        extension, mime = EXPORT_FORMATS[fmt]
+        with download_col, open(export['path'], 'rb') as file:
+            st.download_button(
+                f"Baixar {replace_comma_with_dot(record_count)} registros",
+                data=file, file_name=f"prouni{extension}", mime=mime,
+            )
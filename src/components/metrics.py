@@ -1,48 +1,57 @@
 import streamlit as st
-import pandas as pd
+from src.aggregates import get_metrics
 from src.utils import format_to_brazilian_currency, replace_comma_with_dot
+from src.components.sections import section
 
-def show_metrics(df_filtred: pd.DataFrame):
+@section("Métricas")
+def show_metrics(db_path, filters=None):
     """
     Displays the metrics panel on the dashboard.
 
+    The metrics are read from the precomputed aggregate table, so they do not
+    depend on the size of the filtered data.
+
     Args:
-        df_filtred (pd.DataFrame): The filtered DataFrame with the data to be displayed.
+        db_path (str, Path or list): The path to the SQLite database, or the
+                                     paths of the selected year partitions.
+        filters (dict, optional): The active filters of the sidebar.
     """
+    metrics = get_metrics(db_path, filters)
+
     met1, met2, met3, met4  = st.columns(4)
 
     with met1:
-        total_courses = len(df_filtred['curso'].unique())
+        total_courses = int(metrics['total_cursos'])
         st.metric('Cursos', total_courses)
         
     with met2:
-        min_monthly_fee = float(df_filtred['mensalidade'].min())
+        min_monthly_fee = metrics['mensalidade_min']
         st.metric('Mensalidade mínima', format_to_brazilian_currency(min_monthly_fee))
         
     with met3:
-        max_monthly_fee = df_filtred['mensalidade'].max()
+        max_monthly_fee = metrics['mensalidade_max']
         st.metric('Mensalidade máxima', format_to_brazilian_currency(max_monthly_fee))
         
     with met4:
-        total_universidades = len(df_filtred['universidade'].unique())
+        total_universidades = int(metrics['total_universidades'])
         st.metric('Universidades', total_universidades)
 
     met5, met6, met7 ,met8 = st.columns(4)
 
     with met5:
-        mais_frequente_curso: str = str(df_filtred['curso'].value_counts().first_valid_index())
+        mais_frequente_curso: str = str(metrics['curso_mais_frequente'])
         st.metric('Curso mais ofertado nas universidades', mais_frequente_curso)
 
     with met6:
-        total_cotas = df_filtred['bolsa_integral_cotas'].sum() + df_filtred['bolsa_parcial_cotas'].sum()
+        total_cotas = metrics['total_bolsas_cotas']
         st.metric('Total bolsas para cotas', replace_comma_with_dot(total_cotas))
 
     with met7:
-        total_bolsas = df_filtred['bolsa_integral'].sum() + df_filtred['bolsa_parcial'].sum()
+        total_bolsas = metrics['total_bolsas_ampla']
         st.metric('Total de bolsas', replace_comma_with_dot(total_bolsas))
 
     with met8:
-        estado_mais_frequente: str = str(df_filtred['estado'].value_counts().first_valid_index())
+        estado_mais_frequente: str = str(metrics['estado_mais_frequente'])
         st.metric('Estado mais frequente', estado_mais_frequente)
         
     st.markdown('---')
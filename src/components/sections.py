@@ -0,0 +1,53 @@
+import functools
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+from ..instrumentation import span
+from ..utils import logger
+
+TIMINGS_KEY = 'tempos_secoes'
+
+@contextmanager
+def timed_section(name):
+    """
+    Measures the time spent in a section of the dashboard.
+
+    The last time of each section is kept in the session state, so the
+    sections rerun on their own (fragments) keep their latest time too, and
+    the section is an instrumentation span.
+
+    Args:
+        name (str): The name of the section, as shown to the user.
+    """
+    start = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        st.session_state.setdefault(TIMINGS_KEY, {})[name] = elapsed
+        logger.debug("Section %r took %.1f ms", name, elapsed * 1000)
+
+def section(name, fragment=False):
+    """
+    Declares a function as a timed section of the dashboard.
+
+    A fragment section reruns on its own when one of its widgets changes,
+    with the arguments of the last full run; everything it depends on must
+    therefore be passed as arguments, never read from the rest of the script.
+
+    Args:
+        name (str): The name of the section, as shown to the user.
+        fragment (bool, optional): Whether the section is an `st.fragment`.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed_section(name):
+                return func(*args, **kwargs)
+        return st.fragment(wrapper) if fragment else wrapper
+    return decorator
@@ -1,51 +1,150 @@
 import streamlit as st
-from ..utils import get_unique_values, replace_comma_with_dot
+from ..partitions import YEAR_COLUMN
+from ..search import search
+from ..utils import replace_comma_with_dot
+from .sections import section
 
-def show_sidebar(db_path):
+# Filter column -> label of its multiselect, in display order.
+FILTERS = {
+    'curso_busca': "Curso",
+    'uf': "Estado (UF)",
+    'universidade_nome': "Universidade",
+    'turno': "Períodos",
+    'grau': "Grau",
+}
+
+SEARCH_RESULTS = 8
+
+def _widget_key(column):
+    return f'filtro_{column}'
+
+def selected_years(years):
+    """
+    Returns the years selected in the sidebar, before the sidebar is drawn.
+
+    The dataset depends on the years, so they are read from the session
+    state; the latest year is selected on the first run.
+
+    Args:
+        years (list): The years with a partition, in ascending order.
+
+    Returns:
+        list: The selected years, every year being selected when empty.
+    """
+    key = _widget_key(YEAR_COLUMN)
+    selected = st.session_state.setdefault(key, [years[-1]])
+    available = [year for year in selected if year in years]
+    if available != selected:
+        # a partition was removed since the selection
+        st.session_state[key] = available
+    return available
+
+def _show_year_filter(years):
+    st.sidebar.multiselect(
+        "Ano",
+        options=years,
+        key=_widget_key(YEAR_COLUMN),
+        help="Sem nenhum ano selecionado, todos os anos são combinados.",
+    )
+
+def _add_filter(column, value):
+    # runs before the rerun, so the multiselect is created with the value
+    selected = st.session_state.get(_widget_key(column), [])
+    if value not in selected:
+        st.session_state[_widget_key(column)] = [*selected, value]
+
+def show_search(db_path):
+    """
+    Displays the search box of courses and universities in the sidebar.
+
+    Each result is a button that adds the course or university to its
+    filter, so it reaches the filters without scrolling the multiselects.
+
+    Args:
+        db_path (str, Path or list): The path to the SQLite database, or the
+                                     paths of the partitions to search.
+    """
+    text = st.sidebar.text_input(
+        "Buscar curso ou universidade",
+        key='busca',
+        placeholder="ex.: engenharia civil, sao carlos",
+        help="Busca por nome, campus ou município, sem diferenciar acentos e maiúsculas.",
+    )
+    if not text:
+        return
+
+    results = search(db_path, text, limit=SEARCH_RESULTS)
+    if results.empty:
+        st.sidebar.caption("Nenhum curso ou universidade encontrado.")
+        return
+
+    for column, value, records in results.itertuples(index=False):
+        selected = value in st.session_state.get(_widget_key(column), [])
+        st.sidebar.button(
+            f"{FILTERS[column]}: {value} ({replace_comma_with_dot(records)} registros)",
+            key=f'busca_{column}_{value}',
+            on_click=_add_filter, args=(column, value),
+            disabled=selected,
+            use_container_width=True,
+        )
+
+@section("Filtros")
+def show_sidebar(dataset, db_path, years=None):
     """
     Displays the sidebar with filters and returns active filters.
 
+    The options of each filter only list the values that still have records
+    under the other active filters, each with its number of records and
+    scholarships, all computed in one pass over the shared dataset.
+
     Args:
-        db_path (str or Path): The path to the SQLite database.
+        dataset (Dataset): The shared dataset of the selected years.
+        db_path (str, Path or list): The path to the SQLite database, or the
+                                     paths of the selected year partitions,
+                                     which hold the search index.
+        years (list, optional): The years with a partition. The year filter
+                                is shown when there is more than one.
 
     Returns:
-        dict: A dictionary with active filters.
+        dict: A dictionary with active filters. The years are not part of
+              it: they select the partitions, see `selected_years`.
     """
     st.sidebar.markdown("<h1 style='text-align: center;'> Preferências </h1>", unsafe_allow_html=True)
 
-    courses = get_unique_values(db_path, 'cursos', 'curso_busca')
-    states = get_unique_values(db_path, 'enderecos', 'uf')
-    level_filter_options = get_unique_values(db_path, 'cursos', 'grau')
-    period = get_unique_values(db_path, 'cursos', 'turno')
-    school = get_unique_values(db_path, 'cursos', 'universidade_nome')
+    show_search(db_path)
+
+    if years and len(years) > 1:
+        _show_year_filter(years)
 
-    course_name_filter = st.sidebar.multiselect("Curso", options=courses)
-    states_filter = st.sidebar.multiselect("Estado (UF)", options=states)
-    school_filter = st.sidebar.multiselect("Universidade", options=school)
-    period_filter = st.sidebar.multiselect("Períodos", options=period)
-    level_filter = st.sidebar.multiselect("Grau", options=level_filter_options)
+    # the widget values of the current run are already in the session state
+    current_filters = {
+        column: st.session_state.get(_widget_key(column), []) for column in FILTERS
+    }
+    facets = dataset.facets(current_filters)
 
     active_filters = {}
+    for column, label in FILTERS.items():
+        facet = facets[column]
+        counts = dict(zip(facet['valor'], zip(facet['registros'], facet['bolsas'])))
+        selected = st.sidebar.multiselect(
+            label,
+            options=facet['valor'].tolist(),
+            key=_widget_key(column),
+            format_func=lambda value, counts=counts: (
+                f"{value} ({replace_comma_with_dot(counts[value][0])} registros, "
+                f"{replace_comma_with_dot(counts[value][1])} bolsas)"
+            ),
+        )
+        if selected:
+            active_filters[column] = selected
 
-    if course_name_filter:
-        active_filters['c.curso_busca'] = course_name_filter
-    if states_filter:
-        active_filters['e.uf'] = states_filter
-    if school_filter:
-        active_filters['c.universidade_nome'] = school_filter
-    if level_filter:
-        active_filters['c.grau'] = level_filter
-    if period_filter:
-        active_filters['c.turno'] = period_filter
-    
     return active_filters
 
-def show_record_count(df_filtred): 
+def show_record_count(search_size):
     """
     Displays the count of records found in the sidebar.
 
     Args:
-        df_filtred (pd.DataFrame): The filtered DataFrame.
+        search_size (int): The number of records that match the filters.
     """
-    search_size = len(df_filtred)
     st.sidebar.write(f"Registros encontrados: {replace_comma_with_dot(search_size)}")
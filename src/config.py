@@ -1,114 +1,203 @@
+import sys
 import pandas as pd
-import sqlite3
 from pathlib import Path
-from utils import remove_accents, clean_phone, format_phone
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
 
-BASE_DIR = Path.cwd()
-db_path = BASE_DIR / 'data' / "prouni.sqlite"
-
-#  ----- table1 -------
-conn_cursos = sqlite3.connect(db_path)
-df_cursos = pd.read_sql_query('SELECT * FROM table1', conn_cursos)
-conn_cursos.close()
-
-# ---  data clean ---
-
-df_cursos['grau'] = df_cursos['grau'].fillna('Não especificado')
-df_cursos['grau'] = df_cursos['grau'].str.strip()
-
-df_cursos['turno'] = df_cursos['turno'].fillna('Não especificado')
-df_cursos['turno'] = df_cursos['turno'].str.strip()
-
-df_cursos['mensalidade'] = df_cursos['mensalidade'].fillna('Não especificado')
-
-df_cursos['curso_busca'] = df_cursos['curso_busca'].fillna('Não especificado')
-df_cursos['curso_busca'] = df_cursos['curso_busca'].str.strip()
-
-df_cursos['cidade_busca'] = df_cursos['cidade_busca'].fillna('Não especificado')
-df_cursos['cidade_busca'] = df_cursos['cidade_busca'].str.strip()
-
-df_cursos['uf_busca'] = df_cursos['uf_busca'].fillna('Não especificado')
-df_cursos['uf_busca'] = df_cursos['uf_busca'].str.strip()
-df_cursos['uf_busca'] = df_cursos['uf_busca'].str.upper()
+from src.utils import remove_accents_series, clean_phone_series, format_phone
 
-df_cursos['campus_nome'] = df_cursos['campus_nome'].fillna('Não especificado')
-df_cursos['campus_nome'] = df_cursos['campus_nome'].str.strip()
 
-df_cursos['universidade_nome'] = df_cursos['universidade_nome'].fillna('Não especificado')
-df_cursos['universidade_nome'] = df_cursos['universidade_nome'].str.strip()
-
-df_cursos['nota_integral_ampla'] = df_cursos['nota_integral_ampla'].fillna('Não ofertado')
-
-df_cursos['nota_integral_cotas'] = df_cursos['nota_integral_cotas'].fillna('Não ofertado')
-
-df_cursos['nota_parcial_ampla'] = df_cursos['nota_parcial_ampla'].fillna('Não ofertado')
-
-df_cursos['nota_parcial_cotas'] = df_cursos['nota_parcial_cotas'].fillna('Não ofertado')
-
-scholarship_columns = [
-    'bolsa_integral_cotas', 'bolsa_integral_ampla', 
-    'bolsa_parcial_cotas', 'bolsa_parcial_ampla'
-]
-df_cursos[scholarship_columns] = df_cursos[scholarship_columns].fillna(0).astype(int)
-
-duplicates = df_cursos.duplicated().sum()
-if duplicates > 0:
-    df_cursos = df_cursos.drop_duplicates()
-    print(f"- {duplicates} linhas duplicadas foram removidas.")
-
-# --- save data in a new archive ---
-clean_db_path = BASE_DIR / 'data' / "clean_prouni.sqlite"
-new_conn_table1 = sqlite3.connect(clean_db_path)
-df_cursos.to_sql("cursos", new_conn_table1, if_exists='replace', index=False)
-new_conn_table1.close()
-
-
-#  ---- table 2 -----
-conn_enderecos = sqlite3.connect(db_path)
-df_enderecos = pd.read_sql_query('SELECT * FROM table2 ', conn_enderecos)
-
-# --- data clean ---
-df_enderecos['complemento'] = df_enderecos['complemento'].fillna('Não especificado')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.strip(' -')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.strip('- ')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.strip('S/n -')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.strip('º -')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.strip('')
-df_enderecos['complemento'] = df_enderecos['complemento'].replace(['.', ' - - ', ' ', '°', '-','', 'S/n  -', 'S/N', 'S/n', 'n/d'], 'Não especificado' )
-df_enderecos['complemento'] = df_enderecos['complemento'].str.replace(' - - ', ' ')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??mpar', 'Ímpar')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??regon', 'Éregon')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??rea', 'Área')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??gua', 'Água')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??guas', 'Águas')
-df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??rico', 'Érico')
-
-df_enderecos['bairro'] = df_enderecos['bairro'].replace(['.', '°', '-', 'n/a', 'S/N', 'S/n', 'n/d'], 'Não especificado' )
-df_enderecos['bairro'] = df_enderecos['bairro'].fillna('Não especificado')
-df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??rea', 'Área')
-df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??den', 'Éden')
-df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??gua', 'Água')
-df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??guas', 'Águas')
-df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??tila', 'Átila')
-df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??rvore', 'Árvore')
-    
-df_enderecos['municipio_limpo'] = df_enderecos['municipio'].str.lower()
-df_enderecos['municipio_limpo'] = df_enderecos['municipio_limpo'].apply(remove_accents)
-df_enderecos['municipio_limpo']= df_enderecos['municipio_limpo'].str.title()
-
-df_enderecos['telefone'] = df_enderecos['telefone'].str.strip()
-df_enderecos['telefone'] = df_enderecos['telefone'].replace(['','00','0', '°', '-', 'NI', '.','(A ) defi-nir.', 'A  def-inir', 'S/n -', 'S/N', 'S/n', 'n/d'], 'Não especificado' )
-df_enderecos['telefone_limpo'] = df_enderecos['telefone'].apply(clean_phone)
-df_enderecos['telefone_formatado'] = df_enderecos['telefone_limpo'].apply(format_phone)
-
-df_enderecos['logradouro'] = df_enderecos['logradouro'].fillna('Não especificado')
-df_enderecos['logradouro'] = df_enderecos['logradouro'].str.strip(' ,')
-
-
-# --- save data in a new archive ---
+BASE_DIR = Path.cwd()
+db_path = BASE_DIR / 'data' / "prouni.sqlite"
 clean_db_path = BASE_DIR / 'data' / "clean_prouni.sqlite"
 
-new_conn_table2 = sqlite3.connect(clean_db_path)
-df_enderecos.to_sql("enderecos", new_conn_table2, if_exists='replace', index=False)
-new_conn_table2.close()
+# Columns filtered by the dashboard, indexed in the materialized join.
+INDEXED_COLUMNS = ['curso_busca', 'uf', 'universidade_nome', 'grau', 'turno']
+
+JOINED_TABLE_QUERY = """
+SELECT
+    c.curso_busca,
+    c.grau,
+    c.turno,
+    c.mensalidade,
+    c.mensalidade_especificada,
+    c.universidade_nome,
+    c.campus_nome,
+    c.bolsa_integral_cotas,
+    c.nota_integral_cotas,
+    c.nota_integral_cotas_ofertada,
+    c.bolsa_integral_ampla,
+    c.nota_integral_ampla,
+    c.nota_integral_ampla_ofertada,
+    c.bolsa_parcial_cotas,
+    c.nota_parcial_cotas,
+    c.nota_parcial_cotas_ofertada,
+    c.bolsa_parcial_ampla,
+    c.nota_parcial_ampla,
+    c.nota_parcial_ampla_ofertada,
+    e.municipio_limpo,
+    e.uf,
+    e.telefone_formatado
+FROM
+    cursos AS c
+INNER JOIN
+    enderecos AS e ON c.campus_id = e.id
+"""
+
+# Scholarship totals pre-summed over every combination of the filter columns.
+CUBE_TABLE_QUERY = """
+SELECT
+    curso_busca,
+    uf,
+    universidade_nome,
+    grau,
+    turno,
+    COUNT(*) AS linhas,
+    SUM(bolsa_integral_cotas) AS bolsa_integral_cotas,
+    SUM(bolsa_parcial_cotas) AS bolsa_parcial_cotas,
+    SUM(bolsa_integral_ampla) AS bolsa_integral_ampla,
+    SUM(bolsa_parcial_ampla) AS bolsa_parcial_ampla,
+    COUNT(mensalidade) AS mensalidades,
+    SUM(mensalidade) AS soma_mensalidade,
+    MIN(mensalidade) AS mensalidade_min,
+    MAX(mensalidade) AS mensalidade_max
+FROM
+    cursos_enderecos
+GROUP BY
+    curso_busca, uf, universidade_nome, grau, turno
+"""
+
+# Documents of the full-text search: one per course and per university,
+# whose campuses and municipalities are searchable as context.
+SEARCH_DOCUMENTS_QUERY = """
+SELECT
+    'curso_busca' AS coluna,
+    curso_busca AS valor,
+    '' AS contexto,
+    COUNT(*) AS registros
+FROM
+    cursos_enderecos
+GROUP BY
+    curso_busca
+UNION ALL
+SELECT
+    'universidade_nome' AS coluna,
+    universidade_nome AS valor,
+    COALESCE(GROUP_CONCAT(DISTINCT campus_nome), '') || ' ' ||
+        COALESCE(GROUP_CONCAT(DISTINCT municipio_limpo), '') AS contexto,
+    COUNT(*) AS registros
+FROM
+    cursos_enderecos
+GROUP BY
+    universidade_nome
+"""
+
+
+def clean_cursos(df_cursos: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cleans the raw course data (`table1`).
+
+    Args:
+        df_cursos (pd.DataFrame): The raw rows of `table1`.
+
+    Returns:
+        pd.DataFrame: The cleaned rows. Duplicates are not removed here.
+    """
+    df_cursos['grau'] = df_cursos['grau'].fillna('Não especificado')
+    df_cursos['grau'] = df_cursos['grau'].str.strip()
+
+    df_cursos['turno'] = df_cursos['turno'].fillna('Não especificado')
+    df_cursos['turno'] = df_cursos['turno'].str.strip()
+
+    df_cursos['mensalidade'] = pd.to_numeric(df_cursos['mensalidade'], errors='coerce')
+    df_cursos['mensalidade_especificada'] = df_cursos['mensalidade'].notna()
+
+    df_cursos['curso_busca'] = df_cursos['curso_busca'].fillna('Não especificado')
+    df_cursos['curso_busca'] = df_cursos['curso_busca'].str.strip()
+
+    df_cursos['cidade_busca'] = df_cursos['cidade_busca'].fillna('Não especificado')
+    df_cursos['cidade_busca'] = df_cursos['cidade_busca'].str.strip()
+
+    df_cursos['uf_busca'] = df_cursos['uf_busca'].fillna('Não especificado')
+    df_cursos['uf_busca'] = df_cursos['uf_busca'].str.strip()
+    df_cursos['uf_busca'] = df_cursos['uf_busca'].str.upper()
+
+    df_cursos['campus_nome'] = df_cursos['campus_nome'].fillna('Não especificado')
+    df_cursos['campus_nome'] = df_cursos['campus_nome'].str.strip()
+
+    df_cursos['universidade_nome'] = df_cursos['universidade_nome'].fillna('Não especificado')
+    df_cursos['universidade_nome'] = df_cursos['universidade_nome'].str.strip()
+
+    # grades stay numeric (NULL when not offered), with a flag per modality
+    grade_columns = [
+        'nota_integral_ampla', 'nota_integral_cotas',
+        'nota_parcial_ampla', 'nota_parcial_cotas'
+    ]
+    for column in grade_columns:
+        df_cursos[column] = pd.to_numeric(df_cursos[column], errors='coerce')
+        df_cursos[f'{column}_ofertada'] = df_cursos[column].notna()
+
+    scholarship_columns = [
+        'bolsa_integral_cotas', 'bolsa_integral_ampla',
+        'bolsa_parcial_cotas', 'bolsa_parcial_ampla'
+    ]
+    df_cursos[scholarship_columns] = df_cursos[scholarship_columns].fillna(0).astype(int)
+
+    return df_cursos
+
+
+def clean_enderecos(df_enderecos: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cleans the raw campus address data (`table2`).
+
+    Args:
+        df_enderecos (pd.DataFrame): The raw rows of `table2`.
+
+    Returns:
+        pd.DataFrame: The cleaned rows.
+    """
+    df_enderecos['complemento'] = df_enderecos['complemento'].fillna('Não especificado')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.strip(' -')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.strip('- ')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.strip('S/n -')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.strip('º -')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.strip('')
+    df_enderecos['complemento'] = df_enderecos['complemento'].replace(['.', ' - - ', ' ', '°', '-','', 'S/n  -', 'S/N', 'S/n', 'n/d'], 'Não especificado' )
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.replace(' - - ', ' ')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??mpar', 'Ímpar')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??regon', 'Éregon')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??rea', 'Área')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??gua', 'Água')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??guas', 'Águas')
+    df_enderecos['complemento'] = df_enderecos['complemento'].str.replace('??rico', 'Érico')
+
+    df_enderecos['bairro'] = df_enderecos['bairro'].replace(['.', '°', '-', 'n/a', 'S/N', 'S/n', 'n/d'], 'Não especificado' )
+    df_enderecos['bairro'] = df_enderecos['bairro'].fillna('Não especificado')
+    df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??rea', 'Área')
+    df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??den', 'Éden')
+    df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??gua', 'Água')
+    df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??guas', 'Águas')
+    df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??tila', 'Átila')
+    df_enderecos['bairro'] = df_enderecos['bairro'].str.replace('??rvore', 'Árvore')
+
+    # stripped only, as the original TRIM(uf) filter compared it
+    df_enderecos['uf'] = df_enderecos['uf'].str.strip()
+
+    df_enderecos['municipio_limpo'] = df_enderecos['municipio'].str.lower()
+    df_enderecos['municipio_limpo'] = remove_accents_series(df_enderecos['municipio_limpo'])
+    df_enderecos['municipio_limpo']= df_enderecos['municipio_limpo'].str.title()
+
+    df_enderecos['telefone'] = df_enderecos['telefone'].str.strip()
+    df_enderecos['telefone'] = df_enderecos['telefone'].replace(['','00','0', '°', '-', 'NI', '.','(A ) defi-nir.', 'A  def-inir', 'S/n -', 'S/N', 'S/n', 'n/d'], 'Não especificado' )
+    df_enderecos['telefone_limpo'] = clean_phone_series(df_enderecos['telefone'])
+    df_enderecos['telefone_formatado'] = df_enderecos['telefone_limpo'].apply(format_phone)
+
+    df_enderecos['logradouro'] = df_enderecos['logradouro'].fillna('Não especificado')
+    df_enderecos['logradouro'] = df_enderecos['logradouro'].str.strip(' ,')
+
+    return df_enderecos
+
+
+if __name__ == "__main__":
+    from src.etl import main
+    main()
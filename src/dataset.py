@@ -0,0 +1,447 @@
+import os
+import threading
+from functools import reduce
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from src.config import INDEXED_COLUMNS
+from src.partitions import YEAR_COLUMN
+from src.query_engine import ResultCache, normalize_filters
+from src.utils import JOIN_COLUMNS, load_data_with_join
+
+SCHOLARSHIP_COLUMNS = ['bolsa_integral_cotas', 'bolsa_parcial_cotas', 'bolsa_integral', 'bolsa_parcial']
+
+# Values present in fewer than 1 of every SPARSE_RATIO rows keep the list
+# of their row positions (4 bytes per row) instead of a bitmap (1 bit per
+# row of the whole dataset), whichever is smaller.
+SPARSE_RATIO = 32
+
+
+class BitmapIndex:
+    """An inverted index from each value of the filter columns to its rows.
+
+    Rows are stored as packed bitmaps of 64-bit words, or as sorted position
+    arrays for rare values, like the array and bitmap containers of Roaring
+    bitmaps. Filters are bitwise operations over the words: OR between the
+    values selected in a column and AND across columns, and counts are
+    popcounts, so neither needs the rows themselves.
+
+    Args:
+        codes (dict): The categorical codes (-1 for missing) of each
+                      indexed column.
+        n_rows (int): The number of rows of the dataset.
+    """
+
+    def __init__(self, codes, n_rows):
+        self.n_rows = n_rows
+        self.n_words = -(-n_rows // 64)
+        self._entries = {}
+        for column, column_codes in codes.items():
+            order = np.argsort(column_codes, kind='stable')
+            sorted_codes = column_codes[order]
+            boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+            entries = {}
+            for positions in np.split(order, boundaries):
+                code = int(column_codes[positions[0]]) if len(positions) else -1
+                if code < 0:
+                    continue
+                if len(positions) * SPARSE_RATIO < n_rows:
+                    entries[code] = positions.astype(np.int32)
+                else:
+                    entries[code] = self._pack(positions)
+            self._entries[column] = entries
+
+    def _pack(self, positions):
+        bits = np.zeros(self.n_words * 64, dtype=bool)
+        bits[positions] = True
+        return np.packbits(bits, bitorder='little').view(np.uint64)
+
+    def empty(self):
+        """Returns a bitmap with no rows set."""
+        return np.zeros(self.n_words, dtype=np.uint64)
+
+    def lookup(self, column, codes):
+        """Returns the bitmap of the rows with any of the given codes (OR).
+
+        Args:
+            column (str): An indexed column.
+            codes (iterable): The categorical codes of the selected values.
+
+        Returns:
+            np.ndarray: The bitmap, as 64-bit words.
+        """
+        entries = self._entries[column]
+        bitmap = self.empty()
+        sparse = []
+        for code in codes:
+            entry = entries.get(int(code))
+            if entry is None:
+                continue
+            if entry.dtype == np.uint64:
+                bitmap |= entry
+            else:
+                sparse.append(entry)
+        if sparse:
+            bitmap |= self._pack(np.concatenate(sparse))
+        return bitmap
+
+    def count(self, bitmap):
+        """Counts the rows set in a bitmap."""
+        return int(np.bitwise_count(bitmap).sum())
+
+    def rows(self, bitmap):
+        """Returns the sorted positions of the rows set in a bitmap."""
+        bits = np.unpackbits(bitmap.view(np.uint8), count=self.n_rows, bitorder='little')
+        return np.flatnonzero(bits).astype(np.int32)
+
+
+class Dataset:
+    """The joined data, loaded once and shared read-only by every session.
+
+    Sessions never copy the data: a filter selection is resolved to the
+    positions of the matching rows through a `BitmapIndex` over the filter
+    columns, and views are taken from those positions only when a component
+    needs the rows themselves.
+
+    Args:
+        frame (pd.DataFrame): The unfiltered data, as returned by
+                              `load_data_with_join`. It must not be modified.
+        cache (ResultCache, optional): The cache of resolved selections.
+                                       Defaults to a new `ResultCache`.
+        version (hashable, optional): The identity of the data, used by
+                                      caches derived from the rows. Defaults
+                                      to the identity of the instance.
+    """
+
+    def __init__(self, frame, cache=None, version=None):
+        self.frame = frame
+        self.cache = cache if cache is not None else ResultCache()
+        self.version = version if version is not None else id(self)
+        self._codes = {
+            column: frame[JOIN_COLUMNS[column]].cat.codes.to_numpy()
+            for column in INDEXED_COLUMNS
+        }
+        self._scholarships = frame[SCHOLARSHIP_COLUMNS].sum(axis=1).to_numpy(dtype=np.int64)
+        self.index = BitmapIndex(self._codes, len(frame))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _matching_codes(self, column, value):
+        categories = self.frame[JOIN_COLUMNS[column]].cat.categories
+        if isinstance(value, list):
+            return np.flatnonzero(categories.isin(value))
+        # same semantics as `LIKE '%value%'` in the SQL backend
+        return np.flatnonzero(categories.str.contains(str(value), case=False, regex=False))
+
+    def _lookups(self, filters):
+        """Returns the bitmap of each filtered column, before the AND."""
+        return {
+            column: self.index.lookup(column, self._matching_codes(column, value))
+            for column, value in (filters or {}).items() if value
+        }
+
+    def bitmap(self, filters=None):
+        """Evaluates the filters as a bitmap over the rows.
+
+        Args:
+            filters (dict, optional): The active filters, as returned by
+                                      `show_sidebar`.
+
+        Returns:
+            np.ndarray or None: The bitmap of the rows that match every
+                                filter, or None when nothing is filtered.
+
+        Raises:
+            KeyError: If a filter column is not indexed.
+        """
+        key = ('bitmap', normalize_filters(filters))
+        if not key[1]:
+            return None
+        bitmap = self.cache.get(key)
+        if bitmap is None:
+            bitmap = reduce(np.bitwise_and, self._lookups(filters).values())
+            bitmap.flags.writeable = False
+            self.cache.put(key, bitmap, bitmap.nbytes)
+        return bitmap
+
+    def select(self, filters=None):
+        """Resolves the filters to the positions of the matching rows.
+
+        Selections are cached, so sessions with the same filters share the
+        same (read-only) array.
+
+        Args:
+            filters (dict, optional): The active filters, as returned by
+                                      `show_sidebar`.
+
+        Returns:
+            np.ndarray or None: The matching row positions, or None when
+                                nothing is filtered (every row matches).
+        """
+        bitmap = self.bitmap(filters)
+        if bitmap is None:
+            return None
+        key = ('rows', normalize_filters(filters))
+        rows = self.cache.get(key)
+        if rows is None:
+            rows = self.index.rows(bitmap)
+            rows.flags.writeable = False
+            self.cache.put(key, rows, rows.nbytes)
+        return rows
+
+    def count(self, filters=None):
+        """Counts the rows that match the filters, without resolving them."""
+        bitmap = self.bitmap(filters)
+        return len(self.frame) if bitmap is None else self.index.count(bitmap)
+
+    def facets(self, filters=None):
+        """Computes the available values of every filter column, with counts.
+
+        The values of each column are conditioned on the filters of the
+        other columns only, so selecting a value never hides its
+        alternatives but does hide the values of other columns that would
+        return nothing. Every column is counted in a single pass over the
+        rows left by the other filters; values selected in the filters are
+        always kept, even without rows.
+
+        Args:
+            filters (dict, optional): The active filters, as returned by
+                                      `show_sidebar`.
+
+        Returns:
+            dict: For each indexed column, a DataFrame with the `valor`,
+                  `registros` (matching rows) and `bolsas` (total
+                  scholarships) of its available values, in order. The
+                  frames are cached and must be treated as read-only.
+        """
+        key = ('facets', normalize_filters(filters))
+        facets = self.cache.get(key)
+        if facets is not None:
+            return facets
+
+        lookups = self._lookups(filters)
+        facets = {}
+        for column in INDEXED_COLUMNS:
+            codes, scholarships = self._codes[column], self._scholarships
+            others = [bitmap for other, bitmap in lookups.items() if other != column]
+            if others:
+                rows = self.index.rows(reduce(np.bitwise_and, others))
+                codes, scholarships = codes[rows], scholarships[rows]
+            valid = codes >= 0
+            categories = self.frame[JOIN_COLUMNS[column]].cat.categories
+            facet = pd.DataFrame({
+                'valor': categories,
+                'registros': np.bincount(codes[valid], minlength=len(categories)),
+                'bolsas': np.bincount(
+                    codes[valid], weights=scholarships[valid], minlength=len(categories)
+                ).astype(np.int64),
+            })
+            selected = (filters or {}).get(column)
+            keep = facet['registros'] > 0
+            if isinstance(selected, list):
+                keep |= facet['valor'].isin(selected)
+            facet = facet[keep]
+            if not categories.is_monotonic_increasing:
+                # options are listed in order whatever the order of the categories
+                facet = facet.sort_values('valor', kind='stable')
+            facets[column] = facet.reset_index(drop=True)
+
+        self.cache.put(key, facets, sum(int(f.memory_usage(deep=True).sum()) for f in facets.values()))
+        return facets
+
+    def view(self, rows=None):
+        """Returns the rows at the given positions.
+
+        Args:
+            rows (np.ndarray, optional): Row positions, as returned by `select`.
+                                         Defaults to every row.
+
+        Returns:
+            pd.DataFrame: The shared frame itself when `rows` is None,
+                          otherwise a new frame with the selected rows. It
+                          must be treated as read-only in both cases.
+        """
+        if rows is None:
+            return self.frame
+        return self.frame.take(rows)
+
+    def sort_order(self, column, descending=False):
+        """Returns the positions of every row sorted by a column.
+
+        The order is computed once per column and direction and shared by
+        all sessions. Missing values come last in both directions and ties
+        keep the original row order.
+
+        Args:
+            column (str): A column of the data, by its display name.
+            descending (bool, optional): Whether to sort from largest to smallest.
+
+        Returns:
+            np.ndarray: The sorted row positions (read-only).
+        """
+        key = ('sort', column, descending)
+        order = self.cache.get(key)
+        if order is None:
+            values = self.frame[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes = values.cat.codes.to_numpy()
+                categories = values.cat.categories
+                if not categories.is_monotonic_increasing:
+                    # sort by the position of each category in sorted order
+                    ranks = np.argsort(np.argsort(categories.to_numpy(), kind='stable'))
+                    codes = np.where(codes >= 0, ranks[codes], -1)
+                keys = codes.astype(np.float64)
+                keys[codes < 0] = np.nan
+            else:
+                keys = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            missing = np.isnan(keys)
+            if descending:
+                keys = -keys
+            order = np.lexsort((keys, missing)).astype(np.int32)
+            order.flags.writeable = False
+            self.cache.put(key, order, order.nbytes)
+        return order
+
+    def page(self, filters=None, page=1, page_size=100, sort_by=None, descending=False):
+        """Returns one page of the filtered rows, optionally sorted.
+
+        Only the rows of the requested page are taken from the shared frame.
+        The sorted selection is cached per filters and order, so browsing
+        the pages of a selection is a slice of an array.
+
+        Args:
+            filters (dict, optional): The active filters, as returned by
+                                      `show_sidebar`.
+            page (int, optional): The page number, starting at 1.
+            page_size (int, optional): The number of rows per page.
+            sort_by (str, optional): The display name of the column to sort
+                                     by. Defaults to the stored order.
+            descending (bool, optional): Whether to sort from largest to smallest.
+
+        Returns:
+            pd.DataFrame: The rows of the page, empty past the last page.
+        """
+        rows = self.select(filters)
+        if sort_by is None:
+            ordered = rows if rows is not None else np.arange(len(self.frame), dtype=np.int32)
+        else:
+            order = self.sort_order(sort_by, descending)
+            if rows is None:
+                ordered = order
+            else:
+                key = ('sorted', normalize_filters(filters), sort_by, descending)
+                ordered = self.cache.get(key)
+                if ordered is None:
+                    selected = np.unpackbits(
+                        self.bitmap(filters).view(np.uint8), count=len(self.frame), bitorder='little'
+                    ).view(bool)
+                    ordered = order[selected[order]]
+                    self.cache.put(key, ordered, ordered.nbytes)
+        start = (page - 1) * page_size
+        return self.frame.take(ordered[start:start + page_size])
+
+
+def concat_frames(frames, key_column):
+    """Stacks the frames of several partitions, tagging each row with its key.
+
+    Categorical columns keep a categorical dtype, with the sorted union of
+    the categories of every partition, as the index and the sort orders of
+    `Dataset` expect.
+
+    Args:
+        frames (dict): The frame of each partition, by key (e.g. the year),
+                       in the order to stack them.
+        key_column (str): The name of the column with the partition key,
+                          added as the first column.
+
+    Returns:
+        pd.DataFrame: The rows of every partition, with a new index.
+    """
+    parts = list(frames.values())
+    lengths = [len(frame) for frame in parts]
+    columns = {key_column: np.repeat(list(frames), lengths)}
+    for column in parts[0].columns:
+        values = [frame[column] for frame in parts]
+        if isinstance(values[0].dtype, pd.CategoricalDtype):
+            columns[column] = pd.Series(union_categoricals(values, sort_categories=True))
+        else:
+            columns[column] = pd.concat(values, ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+# Datasets of several years are copies of the partitions, so only the last
+# few combinations are kept.
+COMBINED_DATASETS = 2
+_combined = ResultCache(max_entries=COMBINED_DATASETS, max_bytes=float('inf'))
+
+
+def get_dataset(db_path, backend='sqlite'):
+    """Returns the process-wide dataset of a database.
+
+    The data is loaded on first use and reloaded when the database file is
+    replaced or modified (e.g. by the ETL); every session of the process
+    shares the same instance in between.
+
+    Args:
+        db_path (str or Path): The path to the SQLite database.
+        backend (str, optional): The storage backend of `load_data_with_join`.
+
+    Returns:
+        Dataset: The shared dataset.
+    """
+    path = Path(db_path).resolve()
+    source = path.with_suffix('.parquet') if backend == 'parquet' else path
+    stat = os.stat(source)
+    file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    key = (str(path), backend)
+
+    with _datasets_lock:
+        entry = _datasets.get(key)
+        if entry is None or entry[0] != file_id:
+            entry = _datasets[key] = (
+                file_id, Dataset(load_data_with_join(path, backend=backend), version=(key, file_id))
+            )
+        return entry[1]
+
+
+def get_partitioned_dataset(partitions, backend='sqlite', key_column=YEAR_COLUMN):
+    """Returns the dataset of a selection of year partitions.
+
+    Each partition is loaded on its own by `get_dataset`, so a single year
+    is its own shared dataset whatever the number of years available. Several
+    years are stacked once per combination, with the year in `key_column`,
+    and kept for the next reruns.
+
+    Args:
+        partitions (dict): The path of the database of each selected year.
+        backend (str, optional): The storage backend of `load_data_with_join`.
+        key_column (str, optional): The column that tells the year of each
+                                    row of a combined dataset.
+
+    Returns:
+        Dataset: The shared dataset.
+
+    Raises:
+        ValueError: If no partition is selected.
+    """
+    if not partitions:
+        raise ValueError("No partition selected")
+    datasets = {key: get_dataset(path, backend=backend) for key, path in partitions.items()}
+    if len(datasets) == 1:
+        return next(iter(datasets.values()))
+
+    version = tuple((key, dataset.version) for key, dataset in datasets.items())
+    with _datasets_lock:
+        dataset = _combined.get(version)
+        if dataset is None:
+            frame = concat_frames({key: dataset.frame for key, dataset in datasets.items()}, key_column)
+            dataset = Dataset(frame, version=version)
+            _combined.put(version, dataset, int(frame.memory_usage(deep=True).sum()))
+        return dataset
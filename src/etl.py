@@ -0,0 +1,501 @@
+"""Incremental ETL from the raw Prouni database to the clean one.
+
+Usage:
+    python -m src.etl [--source data/prouni.sqlite] [--target data/clean_prouni.sqlite]
+                      [--chunksize 50000] [--workers 1] [--force]
+
+Besides the clean database, the joined table is exported to a Parquet file
+with the same name (`data/clean_prouni.parquet`), read by the columnar
+backend of the dashboard.
+"""
+import argparse
+import hashlib
+import sqlite3
+import sys
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import zip_longest
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from src.columnar import export_table
+from src.partitions import find_sources
+from src.search import build_search_index
+from src.config import (
+    db_path, clean_db_path, clean_cursos, clean_enderecos,
+    INDEXED_COLUMNS, JOINED_TABLE_QUERY, CUBE_TABLE_QUERY,
+)
+
+# Bump whenever the cleaning rules or the derived tables change, so the next
+# run rebuilds everything instead of being skipped.
+ETL_VERSION = 5
+
+# Rows read, cleaned and written at a time.
+DEFAULT_CHUNKSIZE = 50_000
+
+# clean table -> (raw table, cleaning function)
+TABLES = {
+    'cursos': ('table1', clean_cursos),
+    'enderecos': ('table2', clean_enderecos),
+}
+
+
+def file_checksum(path, block_size=1024 * 1024):
+    """Computes the SHA-256 checksum of a file.
+
+    Args:
+        path (str or Path): The file to read.
+        block_size (int, optional): The read size in bytes.
+
+    Returns:
+        str: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_hashes(df):
+    """Computes a 64-bit content hash for each row of a DataFrame.
+
+    Args:
+        df (pd.DataFrame): The cleaned rows.
+
+    Returns:
+        np.ndarray: One signed 64-bit hash per row, ready to store in SQLite.
+    """
+    return pd.util.hash_pandas_object(df, index=False).to_numpy().view('int64')
+
+
+def add_row_hash(df):
+    """Appends the `row_hash` column to a chunk of cleaned rows."""
+    return df.assign(row_hash=row_hashes(df))
+
+
+def _source_dtypes(conn, table):
+    """Maps the declared SQLite types of a raw table to pandas dtypes.
+
+    Applying them to every chunk keeps the dtypes, and therefore the row
+    hashes, stable even when a chunk happens to hold only NULLs in a column.
+    """
+    dtypes = {}
+    for _, name, declared, *_ in conn.execute(f'PRAGMA table_info("{table}")'):
+        declared = (declared or '').upper()
+        if 'INT' in declared:
+            dtypes[name] = 'Int64'
+        elif any(affinity in declared for affinity in ('CHAR', 'CLOB', 'TEXT')):
+            dtypes[name] = 'object'
+        elif any(affinity in declared for affinity in ('REAL', 'FLOA', 'DOUB')):
+            dtypes[name] = 'float64'
+    return dtypes
+
+
+def read_chunks(conn, table, chunksize=DEFAULT_CHUNKSIZE):
+    """Streams a raw table in chunks with a stable dtype per column.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the raw database.
+        table (str): The name of the raw table.
+        chunksize (int, optional): The number of rows per chunk.
+
+    Yields:
+        pd.DataFrame: The next chunk of raw rows.
+    """
+    dtypes = _source_dtypes(conn, table)
+    for chunk in pd.read_sql_query(f'SELECT * FROM "{table}"', conn, chunksize=chunksize):
+        yield chunk.astype(dtypes)
+
+
+def clean_chunk(table, chunk):
+    """Cleans and hashes one chunk of a raw table.
+
+    This is the unit of work sent to the worker processes, so it only
+    depends on its arguments.
+
+    Args:
+        table (str): The name of the clean table the chunk belongs to.
+        chunk (pd.DataFrame): The raw rows.
+
+    Returns:
+        tuple: The table name, the cleaned chunk and the cleaning time in seconds.
+    """
+    start = time.perf_counter()
+    _, clean = TABLES[table]
+    chunk = add_row_hash(clean(chunk))
+    return table, chunk, time.perf_counter() - start
+
+
+def _tagged(table, chunks):
+    """Pairs each chunk with the name of its table."""
+    for chunk in chunks:
+        yield table, chunk
+
+
+def _interleave(*iterables):
+    """Yields one item of each iterable in turn until all are exhausted."""
+    sentinel = object()
+    for items in zip_longest(*iterables, fillvalue=sentinel):
+        for item in items:
+            if item is not sentinel:
+                yield item
+
+
+def _ordered_map(executor, func, tasks, window):
+    """Maps `func` over `tasks` in a process pool, yielding results in task order.
+
+    At most `window` tasks are in flight, which bounds the memory used by
+    chunks waiting to be cleaned or written.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(func, *task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _timed(iterable, timings, stage):
+    """Adds the time spent producing each item of `iterable` to `timings[stage]`."""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timings[stage] += time.perf_counter() - start
+        yield item
+
+
+def _sql_type(dtype):
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _ensure_table(conn, table, df):
+    """Creates `table` with the columns of `df`, recreating it if they changed."""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+    if columns == list(df.columns):
+        return
+    definitions = ', '.join(f'"{column}" {_sql_type(df[column].dtype)}' for column in df.columns)
+    conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    conn.execute(f'CREATE TABLE "{table}" ({definitions})')
+    conn.execute(f'CREATE UNIQUE INDEX "idx_{table}_row_hash" ON "{table}" (row_hash)')
+
+
+def _to_records(df):
+    """Converts DataFrame rows to tuples of values sqlite3 can bind."""
+    values = df.astype(object).where(df.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+class TableSync:
+    """Synchronizes a clean table with freshly cleaned chunks.
+
+    Rows are identified by their content hash: rows whose hash is not in the
+    table yet are inserted chunk by chunk, rows whose hash no longer appears
+    in any chunk are deleted by `finish` and unchanged rows are left
+    untouched. The hashes seen so far are kept in a temporary table, so rows
+    duplicated across chunks are stored once.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the clean database,
+                                   inside an open transaction.
+        table (str): The name of the clean table.
+    """
+
+    def __init__(self, conn, table):
+        self.conn = conn
+        self.table = table
+        self.stats = {'rows': 0, 'duplicates': 0, 'inserted': 0, 'deleted': 0}
+        self._seen = f'etl_seen_{table}'
+        self._chunk = f'etl_chunk_{table}'
+        self._table_ready = False
+        for temp_table in (self._seen, self._chunk):
+            conn.execute(f'DROP TABLE IF EXISTS temp."{temp_table}"')
+            conn.execute(f'CREATE TEMP TABLE "{temp_table}" (row_hash INTEGER PRIMARY KEY)')
+
+    def write(self, df):
+        """Inserts the rows of a cleaned chunk (with `row_hash`) that are new."""
+        conn = self.conn
+        if not self._table_ready:
+            _ensure_table(conn, self.table, df)
+            self._table_ready = True
+
+        conn.execute(f'DELETE FROM temp."{self._chunk}"')
+        conn.executemany(
+            f'INSERT OR IGNORE INTO temp."{self._chunk}" VALUES (?)', ((h,) for h in df['row_hash'].tolist())
+        )
+        new_hashes = [row[0] for row in conn.execute(f"""
+            SELECT row_hash FROM temp."{self._chunk}"
+            WHERE row_hash NOT IN (SELECT row_hash FROM temp."{self._seen}")
+              AND row_hash NOT IN (SELECT row_hash FROM "{self.table}")
+        """)]
+        unique_rows = conn.execute(
+            f'INSERT OR IGNORE INTO temp."{self._seen}" SELECT row_hash FROM temp."{self._chunk}"'
+        ).rowcount
+
+        new_rows = df[df['row_hash'].isin(new_hashes)].drop_duplicates('row_hash')
+        columns = ', '.join(f'"{column}"' for column in df.columns)
+        placeholders = ', '.join('?' for _ in df.columns)
+        conn.executemany(f'INSERT INTO "{self.table}" ({columns}) VALUES ({placeholders})', _to_records(new_rows))
+
+        self.stats['rows'] += len(df)
+        self.stats['duplicates'] += len(df) - unique_rows
+        self.stats['inserted'] += len(new_rows)
+
+    def finish(self):
+        """Deletes the rows that were not seen in any chunk.
+
+        Returns:
+            dict: The number of rows read, duplicated, inserted and deleted.
+        """
+        if _table_exists(self.conn, self.table):
+            self.stats['deleted'] = self.conn.execute(
+                f'DELETE FROM "{self.table}" WHERE row_hash NOT IN (SELECT row_hash FROM temp."{self._seen}")'
+            ).rowcount
+        for temp_table in (self._seen, self._chunk):
+            self.conn.execute(f'DROP TABLE temp."{temp_table}"')
+        return self.stats
+
+
+def sync_table(conn, table, chunks):
+    """Synchronizes a clean table with a stream of cleaned chunks.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the clean database,
+                                   inside an open transaction.
+        table (str): The name of the clean table.
+        chunks (Iterable[pd.DataFrame]): The cleaned rows, with `row_hash`.
+
+    Returns:
+        dict: The number of rows read, duplicated, inserted and deleted.
+    """
+    sync = TableSync(conn, table)
+    for df in chunks:
+        sync.write(df)
+    return sync.finish()
+
+
+def _table_exists(conn, table):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+
+def rebuild_derived_tables(conn):
+    """Rebuilds the tables read by the dashboard and their indexes: the
+    materialized join (`cursos_enderecos`), the aggregate cube
+    (`cubo_bolsas`) and the full-text search table (`busca`)."""
+    conn.execute('DROP TABLE IF EXISTS cubo_bolsas')
+    conn.execute('DROP TABLE IF EXISTS cursos_enderecos')
+    conn.execute(f'CREATE TABLE cursos_enderecos AS {JOINED_TABLE_QUERY}')
+    conn.execute(f'CREATE TABLE cubo_bolsas AS {CUBE_TABLE_QUERY}')
+    for table in ('cursos_enderecos', 'cubo_bolsas'):
+        for column in INDEXED_COLUMNS:
+            conn.execute(f"CREATE INDEX idx_{table}_{column} ON {table} ({column})")
+    build_search_index(conn)
+    conn.execute('ANALYZE')
+
+
+def export_parquet(conn, path, chunksize=DEFAULT_CHUNKSIZE):
+    """Exports `cursos_enderecos` to the Parquet file of the columnar backend.
+
+    Rows are sorted by state and course, the most selective filters, so the
+    row group statistics let filtered reads skip most of the file.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the clean database.
+        path (str or Path): The Parquet file to write.
+        chunksize (int, optional): The number of rows read at a time.
+
+    Returns:
+        int: The number of rows written.
+    """
+    return export_table(conn, 'cursos_enderecos', path, sort_by=['uf', 'curso_busca'], chunksize=chunksize)
+
+
+def _ensure_state_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS etl_state (
+            source TEXT PRIMARY KEY,
+            mtime REAL NOT NULL,
+            checksum TEXT NOT NULL,
+            etl_version INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+
+
+def _save_state(conn, source, mtime, checksum):
+    conn.execute(
+        'INSERT OR REPLACE INTO etl_state VALUES (?, ?, ?, ?, ?)',
+        (source, mtime, checksum, ETL_VERSION, datetime.now(timezone.utc).isoformat()),
+    )
+
+
+def _skip(conn, parquet_path, chunksize):
+    """Ends a run with nothing to synchronize, exporting the Parquet file if missing."""
+    if not parquet_path.exists():
+        export_parquet(conn, parquet_path, chunksize)
+        print(f"Arquivo Parquet gerado em {parquet_path}.")
+    print("Nenhuma alteração na fonte; nada a fazer.")
+    return {'skipped': True}
+
+
+def run(source=db_path, target=clean_db_path, force=False, chunksize=DEFAULT_CHUNKSIZE, workers=1):
+    """Runs the ETL, touching only what changed since the last run.
+
+    The run is skipped when the source file has the same modification time
+    or checksum as in the last run. Otherwise the raw tables are streamed in
+    chunks, cleaned (in a pool of `workers` processes when greater than one,
+    with chunks of both tables in flight at once) and synchronized in the
+    order they were read, so the result does not depend on the number of
+    workers. The derived tables are then rebuilt, all in a single
+    transaction, so readers never see a half-written database. Memory use
+    is bounded by the chunk size and the number of workers. Finally the
+    joined table is exported to the Parquet file next to `target`.
+
+    Args:
+        source (str or Path, optional): The raw database. Defaults to `data/prouni.sqlite`.
+        target (str or Path, optional): The clean database. Defaults to `data/clean_prouni.sqlite`.
+        force (bool, optional): Whether to run even if nothing changed. Defaults to False.
+        chunksize (int, optional): The number of rows processed at a time.
+        workers (int, optional): The number of cleaning processes. Defaults to 1,
+                                 which cleans in the current process.
+
+    Returns:
+        dict: The per-table summary and the per-stage timings, or
+              `{'skipped': True}` if nothing changed.
+    """
+    started = time.perf_counter()
+    parquet_path = Path(target).with_suffix('.parquet')
+    source = Path(source).resolve()
+    source_key = str(source)
+    mtime = source.stat().st_mtime
+
+    conn = sqlite3.connect(target, isolation_level=None)
+    try:
+        _ensure_state_table(conn)
+        state = conn.execute(
+            'SELECT mtime, checksum, etl_version FROM etl_state WHERE source = ?', (source_key,)
+        ).fetchone()
+        up_to_date = state is not None and state[2] == ETL_VERSION and not force
+
+        if up_to_date and state[0] == mtime:
+            return _skip(conn, parquet_path, chunksize)
+        checksum = file_checksum(source)
+        if up_to_date and state[1] == checksum:
+            _save_state(conn, source_key, mtime, checksum)
+            return _skip(conn, parquet_path, chunksize)
+
+        summary = {}
+        timings = defaultdict(float)
+        source_conn = sqlite3.connect(f"{source.as_uri()}?mode=ro", uri=True)
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            syncs = {table: TableSync(conn, table) for table in TABLES}
+            readers = [
+                _tagged(table, read_chunks(source_conn, source_table, chunksize))
+                for table, (source_table, _) in TABLES.items()
+            ]
+            tasks = _timed(_interleave(*readers), timings, 'leitura')
+            if executor is None:
+                cleaned = (clean_chunk(*task) for task in tasks)
+            else:
+                cleaned = _ordered_map(executor, clean_chunk, tasks, window=2 * workers)
+
+            for table, chunk, clean_time in cleaned:
+                timings[f'limpeza {table}'] += clean_time
+                start = time.perf_counter()
+                syncs[table].write(chunk)
+                timings['gravação'] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            summary = {table: sync.finish() for table, sync in syncs.items()}
+            changed = any(stats['inserted'] or stats['deleted'] for stats in summary.values())
+            if changed or not up_to_date:
+                rebuild_derived_tables(conn)
+            _save_state(conn, source_key, mtime, checksum)
+            conn.execute('COMMIT')
+            timings['tabelas derivadas e commit'] += time.perf_counter() - start
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            source_conn.close()
+
+        # after the commit, so a failed export is not hidden by a ROLLBACK
+        if changed or not up_to_date or not parquet_path.exists():
+            start = time.perf_counter()
+            try:
+                export_parquet(conn, parquet_path, chunksize)
+            except Exception:
+                # drop the stale copy, so the next run exports it again
+                if parquet_path.is_file():
+                    parquet_path.unlink()
+                raise
+            timings['exportação parquet'] += time.perf_counter() - start
+    finally:
+        conn.close()
+
+    timings['total'] = time.perf_counter() - started
+    for table, stats in summary.items():
+        print(
+            f"- {table}: {stats['inserted']} linhas inseridas, {stats['deleted']} removidas, "
+            f"{stats['duplicates']} duplicadas ignoradas."
+        )
+    print("Tempo por etapa (a limpeza soma o tempo de todos os workers):")
+    for stage, seconds in timings.items():
+        print(f"  {stage:<28}{seconds:>8.2f} s")
+    summary['timings'] = dict(timings)
+    return summary
+
+
+def main(argv=None):
+    """Command-line entry point of the ETL.
+
+    Without `--source` and `--target`, every year found in `data/` is
+    cleaned into its own partition (see `find_sources`), or only the years
+    given with `--year`.
+    """
+    parser = argparse.ArgumentParser(description='Limpa os dados brutos do Prouni e atualiza o banco limpo.')
+    parser.add_argument('--source', type=Path, help='banco de dados bruto (padrão: os de todos os anos em data/)')
+    parser.add_argument('--target', type=Path, help='banco de dados limpo')
+    parser.add_argument('--year', type=int, action='append', help='ano a processar; pode ser repetido')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help='linhas processadas por vez')
+    parser.add_argument('--workers', type=int, default=1, help='processos usados na limpeza')
+    parser.add_argument('--force', action='store_true', help='processa mesmo sem alterações na fonte')
+    args = parser.parse_args(argv)
+    options = dict(force=args.force, chunksize=args.chunksize, workers=args.workers)
+
+    if args.source or args.target:
+        run(args.source or db_path, args.target or clean_db_path, **options)
+        return
+
+    sources = find_sources(Path(db_path).parent)
+    if args.year:
+        sources = {year: paths for year, paths in sources.items() if year in args.year}
+    if not sources:
+        parser.error('nenhum banco de dados bruto encontrado para os anos pedidos')
+    for year, (source, target) in sources.items():
+        print(f"Ano {year}: {source.name} -> {target.name}")
+        run(source, target, **options)
+
+if __name__ == '__main__':
+    main()
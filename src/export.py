@@ -0,0 +1,170 @@
+import gzip
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows taken from the dataset and written at a time.
+EXPORT_CHUNKSIZE = 50_000
+
+# Exports of every session are written to one directory. Whenever a new
+# export is written, files older than EXPORT_MAX_AGE seconds or beyond the
+# EXPORT_MAX_FILES newest are deleted, so sessions that are abandoned before
+# replacing their file do not leave it behind for good.
+EXPORT_DIR = Path(os.environ.get('PROUNI_EXPORT_DIR', Path(tempfile.gettempdir()) / 'prouni_exports'))
+EXPORT_MAX_AGE = float(os.environ.get('PROUNI_EXPORT_MAX_AGE', 3600))
+EXPORT_MAX_FILES = int(os.environ.get('PROUNI_EXPORT_MAX_FILES', 20))
+EXPORT_PREFIX = 'prouni_'
+
+# format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def iter_chunks(dataset, filters=None, chunksize=EXPORT_CHUNKSIZE):
+    """Yields the filtered rows of a dataset in chunks.
+
+    Args:
+        dataset (Dataset): The shared dataset.
+        filters (dict, optional): The active filters, as returned by `show_sidebar`.
+        chunksize (int, optional): The number of rows per chunk.
+
+    Yields:
+        pd.DataFrame: The next rows, at most `chunksize` of them.
+    """
+    rows = dataset.select(filters)
+    if rows is None:
+        rows = np.arange(len(dataset), dtype=np.int32)
+    for start in range(0, len(rows), chunksize):
+        yield dataset.view(rows[start:start + chunksize])
+
+
+def write_export(dataset, file, fmt='csv', filters=None, chunksize=EXPORT_CHUNKSIZE):
+    """Writes the filtered rows of a dataset to a binary file, chunk by chunk.
+
+    Only one chunk is held in memory at a time, whatever the size of the
+    selection.
+
+    Args:
+        dataset (Dataset): The shared dataset.
+        file (file-like): The binary file to write to.
+        fmt (str, optional): One of `EXPORT_FORMATS`. Defaults to `csv`.
+        filters (dict, optional): The active filters, as returned by `show_sidebar`.
+        chunksize (int, optional): The number of rows written at a time.
+
+    Returns:
+        int: The number of rows written.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {list(EXPORT_FORMATS)}")
+
+    rows = 0
+    chunks = iter_chunks(dataset, filters, chunksize)
+    if fmt == 'parquet':
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(file, table.schema, compression='zstd')
+                writer.write_table(table)
+                rows += len(chunk)
+            if writer is None:
+                # no rows: still write a valid file with the columns
+                pq.write_table(pa.Table.from_pandas(dataset.view(np.array([], dtype=np.int32)), preserve_index=False), file)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
+    binary = gzip.GzipFile(fileobj=file, mode='wb') if fmt == 'csv.gz' else file
+    text = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+    try:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(text, index=False, header=header)
+            header = False
+            rows += len(chunk)
+        if header:
+            dataset.view(np.array([], dtype=np.int32)).to_csv(text, index=False)
+        text.flush()
+    finally:
+        # detach so closing the wrapper does not close the caller's file
+        text.detach()
+        if binary is not file:
+            binary.close()
+    return rows
+
+
+def prune_exports(directory=EXPORT_DIR, max_age=EXPORT_MAX_AGE, max_files=EXPORT_MAX_FILES):
+    """Deletes the old files of the export directory.
+
+    Args:
+        directory (str or Path, optional): The export directory.
+        max_age (float, optional): The age, in seconds, past which a file
+                                   is deleted.
+        max_files (int, optional): The number of newest files kept.
+
+    Returns:
+        int: The number of deleted files.
+    """
+    files = []
+    for path in Path(directory).glob(f'{EXPORT_PREFIX}*'):
+        try:
+            files.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            # deleted by another session meanwhile
+            continue
+    files.sort(reverse=True)
+
+    now = time.time()
+    removed = 0
+    for position, (mtime, path) in enumerate(files):
+        if position >= max_files or now - mtime > max_age:
+            try:
+                path.unlink()
+                removed += 1
+            except FileNotFoundError:
+                continue
+    return removed
+
+
+def export_to_tempfile(dataset, fmt='csv', filters=None, chunksize=EXPORT_CHUNKSIZE, directory=EXPORT_DIR):
+    """Writes the filtered rows of a dataset to a new file of the export directory.
+
+    The old files of the directory are pruned once the file is written, so
+    the directory stays bounded even if callers never delete their files.
+
+    Args:
+        dataset (Dataset): The shared dataset.
+        fmt (str, optional): One of `EXPORT_FORMATS`. Defaults to `csv`.
+        filters (dict, optional): The active filters, as returned by `show_sidebar`.
+        chunksize (int, optional): The number of rows written at a time.
+        directory (str or Path, optional): The export directory.
+
+    Returns:
+        str: The path of the file. The caller may delete it as soon as it is
+             no longer needed; otherwise `prune_exports` eventually does.
+    """
+    suffix = EXPORT_FORMATS[fmt][0] if fmt in EXPORT_FORMATS else ''
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(prefix=EXPORT_PREFIX, suffix=suffix, dir=directory, delete=False) as file:
+        try:
+            write_export(dataset, file, fmt, filters, chunksize)
+        except Exception:
+            os.remove(file.name)
+            raise
+    prune_exports(directory)
+    return file.name
@@ -0,0 +1,395 @@
+import hashlib
+import os
+import textwrap
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from src.aggregates import box_statistics, density_bins, outlier_positions
+from src.instrumentation import span
+from src.query_engine import ResultCache
+
+PRIMARY_COLOR = "#0F90DB"
+SECONDARY_COLOR = "#AE25EE"
+THIRD_COLOR = "#06CA96"
+ORANGE_COLOR = "#FF7C25"
+YELLOW_COLOR = "#FFD82C"
+GRAY_COLOR = '#999999'
+SCALE_COLOR_MAP = 'Blues'
+CATEGORIES_COLORS = [PRIMARY_COLOR, SECONDARY_COLOR, THIRD_COLOR, ORANGE_COLOR, YELLOW_COLOR, GRAY_COLOR]
+
+SCHOLARSHIP_COLUMNS = ['bolsa_integral_cotas', 'bolsa_parcial_cotas', 'bolsa_integral', 'bolsa_parcial']
+SCHOLARSHIP_NAMES = {
+    'bolsa_integral_cotas': 'Integral - Cotas',
+    'bolsa_parcial_cotas': 'Parcial - Cotas',
+    'bolsa_integral': 'Integral - Ampla',
+    'bolsa_parcial': 'Parcial - Ampla',
+}
+
+# Built figures are shared by every session of the process; entries expire
+# after FIGURE_CACHE_TTL seconds so rarely used filter combinations do not
+# hold memory for the whole life of the server.
+FIGURE_CACHE_ENTRIES = 256
+FIGURE_CACHE_BYTES = 128 * 1024 ** 2
+FIGURE_CACHE_TTL = float(os.environ.get('PROUNI_FIGURE_CACHE_TTL', 600))
+
+_figure_cache = ResultCache(FIGURE_CACHE_ENTRIES, FIGURE_CACHE_BYTES, ttl=FIGURE_CACHE_TTL)
+
+
+def data_digest(*frames):
+    """Hashes the contents of DataFrames, including their column names.
+
+    Args:
+        *frames (pd.DataFrame): The frames to hash, usually small aggregates.
+
+    Returns:
+        str: A hex digest that changes whenever any value or column changes.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for frame in frames:
+        digest.update(repr(list(frame.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cached_figure(name, key, build):
+    """Returns a figure from the process-wide figure cache, building it on a miss.
+
+    Args:
+        name (str): The name of the chart.
+        key (hashable): What the figure depends on, such as the filters and
+                        a `data_digest` of its input.
+        build (callable): Builds the figure when it is not cached; receives
+                          no arguments and may return None when there is
+                          nothing to plot, which is not cached.
+
+    Returns:
+        go.Figure or None: The figure, shared with other sessions, so it
+                           must not be modified.
+    """
+    cache_key = (name, key)
+    with span('figure', chart=name) as figure_span:
+        fig = _figure_cache.get(cache_key)
+        if fig is not None:
+            figure_span.set(cached=True)
+            return fig
+        fig = build()
+        if fig is not None:
+            size = len(fig.to_json())
+            figure_span.set(cached=False, bytes=size)
+            _figure_cache.put(cache_key, fig, size)
+    return fig
+
+
+def figure_cache_stats():
+    """Returns the counters of the figure cache."""
+    return _figure_cache.stats()
+
+
+def clear_figure_cache():
+    """Drops every cached figure, keeping the counters."""
+    _figure_cache.clear()
+
+
+def build_ranking_figure(ranking, label, title, wrap_width=40, outside_ratio=0.30):
+    """Builds a horizontal bar chart of the top values of a ranking.
+
+    Args:
+        ranking (pd.Series): The total scholarships, indexed by name.
+        label (str): The name of the ranked dimension, such as "Universidade".
+        title (str): The title of the chart.
+        wrap_width (int, optional): The width at which names are wrapped.
+        outside_ratio (float, optional): Bars shorter than this fraction of
+                                         the longest one show their value
+                                         outside the bar.
+
+    Returns:
+        go.Figure or None: The figure, or None when the ranking is empty.
+    """
+    if ranking.empty:
+        return None
+    ranking = ranking.sort_values(ascending=True)
+    formatted_labels = ['<br>'.join(textwrap.wrap(name, wrap_width)) for name in ranking.index]
+
+    max_value = ranking.max()
+    text_positions = []
+    text_font_colors = []
+    for value in ranking:
+        if value < max_value * outside_ratio:
+            text_positions.append('outside')
+            text_font_colors.append(GRAY_COLOR)
+        else:
+            text_positions.append('inside')
+            text_font_colors.append('white')
+
+    fig = px.bar(
+        x=ranking.values,
+        y=formatted_labels,
+        orientation='h',
+        labels={'x': 'Total de Bolsas', 'y': label},
+        text=ranking.values,
+        color_discrete_sequence=[PRIMARY_COLOR]
+    )
+    fig.update_traces(
+        hovertemplate=f'<b>{label}:</b> %{{customdata}}<br><b>Total de Bolsas:</b> %{{x:,.0f}}<extra></extra>',
+        customdata=ranking.index,
+        texttemplate='%{x:,.0f}',
+        textposition=text_positions,
+        textfont_color=text_font_colors
+    )
+    fig.update_layout(
+        title_text=title,
+        title_x=0.5,
+        title_xanchor="center",
+        margin=dict(l=150, r=50, t=50, b=50)
+    )
+    return fig
+
+
+def build_box_figure(df):
+    """Builds the box plot of the monthly fee per period.
+
+    Only the quartiles and fences of each period are sent to the browser.
+
+    Args:
+        df (pd.DataFrame): The filtered courses.
+
+    Returns:
+        go.Figure: The figure.
+    """
+    box_stats = box_statistics(df, 'período', 'mensalidade')
+    fig = go.Figure()
+    for i, row in enumerate(box_stats.itertuples(index=False)):
+        fig.add_trace(go.Box(
+            name=str(row[0]),
+            x=[row[0]],
+            q1=[row.q1], median=[row.median], q3=[row.q3],
+            lowerfence=[row.lowerfence], upperfence=[row.upperfence],
+            marker_color=CATEGORIES_COLORS[i % len(CATEGORIES_COLORS)],
+        ))
+    fig.update_layout(
+        xaxis_title='período do Curso',
+        yaxis_title='Mensalidade (R$)',
+        legend_title_text='período',
+    )
+    return fig
+
+
+def build_scatter_figure(df, max_points=5000, bins=40, outliers=200):
+    """Builds the scatter plot of the monthly fee against the scholarships.
+
+    Up to `max_points` courses are drawn individually. Above that, the
+    points are binned per level, with the marker area proportional to the
+    number of courses, and only the `outliers` most atypical courses are
+    drawn individually.
+
+    Args:
+        df (pd.DataFrame): The filtered courses.
+        max_points (int, optional): The most courses drawn individually.
+        bins (int, optional): The number of bins on each axis.
+        outliers (int, optional): The number of outliers kept as points.
+
+    Returns:
+        go.Figure: The figure.
+    """
+    total_scholarships = df[SCHOLARSHIP_COLUMNS].sum(axis=1).rename('total_bolsas')
+
+    point_hovertemplate = (
+        '<b>%{customdata[0]}</b><br>' +
+        '<b>Curso:</b> %{customdata[1]}<br>' +
+        '<b>Nível:</b> %{customdata[2]}<br>' +
+        '<b>Mensalidade:</b> R$ %{x:,.2f}<br>' +
+        '<b>Total de Bolsas:</b> %{y:,.0f}<extra></extra>'
+    )
+
+    if len(df) <= max_points:
+        fig = px.scatter(
+            df,
+            x='mensalidade',
+            y=total_scholarships,
+            color='nível',
+            labels={'mensalidade': 'Valor da Mensalidade (R$)', 'total_bolsas': 'Nº Total de Bolsas'},
+            hover_data=['universidade', 'curso', 'nível'],
+            color_discrete_sequence=CATEGORIES_COLORS
+        )
+        fig.update_traces(hovertemplate=point_hovertemplate)
+        return fig
+
+    binned = density_bins(df['mensalidade'], total_scholarships, df['nível'], bins)
+    outlier_rows = outlier_positions(df['mensalidade'], total_scholarships, outliers)
+    df_outliers = df.take(outlier_rows).assign(total_bolsas=total_scholarships.to_numpy()[outlier_rows])
+    max_count = binned['contagem'].max() if not binned.empty else 1
+
+    fig = go.Figure()
+    for i, (level, level_bins) in enumerate(binned.groupby('grupo', sort=True)):
+        color = CATEGORIES_COLORS[i % len(CATEGORIES_COLORS)]
+        fig.add_trace(go.Scatter(
+            x=level_bins['x'], y=level_bins['y'], mode='markers', name=str(level),
+            legendgroup=str(level),
+            marker=dict(
+                color=color, opacity=0.6, sizemode='area', sizemin=3,
+                size=level_bins['contagem'], sizeref=max_count / 30 ** 2,
+            ),
+            customdata=level_bins['contagem'],
+            hovertemplate=f'<b>Nível:</b> {level}<br>' +
+                          '<b>Mensalidade:</b> ~R$ %{x:,.2f}<br>' +
+                          '<b>Total de Bolsas:</b> ~%{y:,.0f}<br>' +
+                          '<b>Cursos:</b> %{customdata:,.0f}<extra></extra>',
+        ))
+        level_outliers = df_outliers[df_outliers['nível'] == level]
+        if not level_outliers.empty:
+            fig.add_trace(go.Scatter(
+                x=level_outliers['mensalidade'], y=level_outliers['total_bolsas'],
+                mode='markers', name=str(level), legendgroup=str(level), showlegend=False,
+                marker=dict(color=color, size=6, line=dict(width=1, color='white')),
+                customdata=level_outliers[['universidade', 'curso', 'nível']].astype(str).to_numpy(),
+                hovertemplate=point_hovertemplate,
+            ))
+    fig.update_layout(
+        xaxis_title='Valor da Mensalidade (R$)',
+        yaxis_title='Nº Total de Bolsas',
+        legend_title_text='nível',
+    )
+    return fig
+
+
+def build_level_figure(df_level_distribution):
+    """Builds the donut chart of the scholarships per level.
+
+    Args:
+        df_level_distribution (pd.DataFrame): The `bolsas_por_nivel` aggregate.
+
+    Returns:
+        go.Figure or None: The figure, or None when there are no scholarships.
+    """
+    if df_level_distribution.empty or df_level_distribution['total_bolsas'].sum() <= 0:
+        return None
+    fig = px.pie(
+        df_level_distribution,
+        names='nível',
+        values='total_bolsas',
+        hole=0.3,
+        color='nível',
+        color_discrete_sequence=CATEGORIES_COLORS
+    )
+    fig.update_traces(
+        textinfo='percent+label',
+        hovertemplate='<b>%{label}</b><br>Quantidade: %{value:,.0f}<br>Percentual: %{percent:.1%}<extra></extra>'
+    )
+    return fig
+
+
+def build_sunburst_figure(df_states):
+    """Builds the sunburst of the scholarships per type and state.
+
+    Args:
+        df_states (pd.DataFrame): The `bolsas_por_estado` aggregate, one row
+                                  per state.
+
+    Returns:
+        go.Figure or None: The figure, or None when there are no scholarships.
+    """
+    df_long_format = pd.melt(
+        df_states,
+        id_vars=['estado'],
+        value_vars=SCHOLARSHIP_COLUMNS,
+        var_name='tipo_bolsa',
+        value_name='quantidade'
+    )
+    df_long_format['tipo_bolsa'] = df_long_format['tipo_bolsa'].map(SCHOLARSHIP_NAMES)
+    df_long_format = df_long_format[df_long_format['quantidade'] > 0]
+    if df_long_format.empty:
+        return None
+
+    fig = px.sunburst(
+        df_long_format,
+        path=['tipo_bolsa', 'estado'],
+        values='quantidade',
+        color='tipo_bolsa',
+        color_discrete_sequence=CATEGORIES_COLORS
+    )
+    fig.update_traces(
+        textinfo='label+percent parent',
+        hovertemplate='<b>%{label}</b><br>Quantidade: %{value:,.0f}<br>Percentual: %{percentParent:.1%}<extra></extra>'
+    )
+    fig.update_layout(
+        legend_title_text='Tipo de Bolsa',
+        showlegend=True,
+    )
+    return fig
+
+
+def build_states_map_figure(average_monthly_per_state, geojson):
+    """Builds the choropleth of the average monthly fee per state.
+
+    Args:
+        average_monthly_per_state (pd.DataFrame): The
+            `mensalidade_media_por_estado` aggregate.
+        geojson (dict): The state boundaries, as returned by `load_brazil_states`.
+
+    Returns:
+        go.Figure: The figure.
+    """
+    fig = px.choropleth(
+        average_monthly_per_state,
+        geojson=geojson,
+        locations='estado',
+        featureidkey='properties.sigla',
+        color='mensalidade',
+        color_continuous_scale=SCALE_COLOR_MAP,
+        scope='south america',
+        labels={'mensalidade': 'Mensalidade Média (R$)', 'uf_busca': 'Estado'}
+    )
+    fig.update_geos(
+        visible=False,
+        projection_type="mercator",
+        center={"lat": -14, "lon": -53},
+        fitbounds="locations"
+    )
+    fig.update_layout(
+        width=1000,
+        height=800,
+        margin={"r": 0, "t": 30, "l": 0, "b": 0}
+    )
+    fig.update_traces(
+        hovertemplate='<b>%{location}</b><br><b>Mensalidade Média:</b> R$ %{z:.2f}<extra></extra>'
+    )
+    return fig
+
+
+def build_state_bars_figure(df_states):
+    """Builds the stacked bars of quota and open-competition scholarships per state.
+
+    Args:
+        df_states (pd.DataFrame): The `bolsas_por_estado` aggregate, one row
+                                  per state.
+
+    Returns:
+        go.Figure: The figure.
+    """
+    df_groupby = pd.DataFrame({
+        'estado': df_states['estado'],
+        'total_bolsas_cotas': df_states['bolsa_integral_cotas'] + df_states['bolsa_parcial_cotas'],
+        'total_bolsas_ampla': df_states['bolsa_integral'] + df_states['bolsa_parcial'],
+    })
+    df_groupby['total_geral'] = df_groupby['total_bolsas_cotas'] + df_groupby['total_bolsas_ampla']
+    df_groupby = df_groupby.sort_values(by='total_geral', ascending=False)
+
+    fig = px.bar(
+        df_groupby,
+        x='estado',
+        y=['total_bolsas_cotas', 'total_bolsas_ampla'],
+        title='',
+        labels={'value': 'Quantidade de Bolsas', 'estado': 'Estado', 'variable': 'Tipo de Bolsa'},
+        color_discrete_map={
+            'total_bolsas_cotas': SECONDARY_COLOR,
+            'total_bolsas_ampla': PRIMARY_COLOR
+        }
+    )
+    new_names = {'total_bolsas_cotas': 'Bolsas para Cotas', 'total_bolsas_ampla': 'Bolsas - Ampla Concorrência'}
+    fig.for_each_trace(lambda t: t.update(name=new_names[t.name]))
+    fig.update_traces(
+        hovertemplate="<br><b>Estado</b>: %{x}<br><b>Tipo</b>: %{fullData.name}<br><b>Quantidade</b>: %{y:,.0f}<extra></extra>"
+    )
+    return fig
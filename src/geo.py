@@ -0,0 +1,171 @@
+"""Geometry of the Brazilian states used by the choropleth map.
+
+The dashboard reads a simplified copy of the states GeoJSON bundled in
+`src/assets`, so rendering the map needs no network access. The bundled file
+is (re)generated from the public source with:
+
+    python -m src.geo [--url URL] [--tolerance 0.01] [--output PATH]
+"""
+import argparse
+import json
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+SOURCE_URL = 'https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson'
+GEOJSON_PATH = Path(__file__).resolve().parent / 'assets' / 'brazil-states.geojson'
+
+# In degrees: ~1 km, far below what a state-level map can show.
+DEFAULT_TOLERANCE = 0.01
+COORDINATE_DECIMALS = 4
+KEPT_PROPERTIES = ('sigla', 'name')
+
+
+def _douglas_peucker(points, tolerance):
+    """Simplifies a line with the Douglas-Peucker algorithm.
+
+    Args:
+        points (np.ndarray): An (n, 2) array of coordinates.
+        tolerance (float): The maximum distance between the original line
+                           and the simplified one.
+
+    Returns:
+        np.ndarray: The kept points, including both ends.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            # closed ring: distance to the start point
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+
+def _simplify_ring(ring, tolerance):
+    points = np.asarray(ring, dtype=float)
+    simplified = _douglas_peucker(points, tolerance)
+    if len(simplified) < 4:
+        # smaller than the tolerance: keep a triangle so the ring stays valid
+        simplified = points[np.linspace(0, len(points) - 1, 4).astype(int)]
+    return np.round(simplified, COORDINATE_DECIMALS).tolist()
+
+
+def simplify_geojson(geojson, tolerance=DEFAULT_TOLERANCE):
+    """Simplifies the polygons of a FeatureCollection for the dashboard.
+
+    Each ring is simplified with the Douglas-Peucker algorithm, coordinates
+    are rounded and only the properties used by the map are kept.
+
+    Args:
+        geojson (dict): A FeatureCollection of Polygon or MultiPolygon features.
+        tolerance (float, optional): The simplification tolerance, in degrees.
+
+    Returns:
+        dict: The simplified FeatureCollection.
+    """
+    features = []
+    for feature in geojson['features']:
+        geometry = feature['geometry']
+        if geometry['type'] == 'Polygon':
+            coordinates = [_simplify_ring(ring, tolerance) for ring in geometry['coordinates']]
+        elif geometry['type'] == 'MultiPolygon':
+            coordinates = [
+                [_simplify_ring(ring, tolerance) for ring in polygon]
+                for polygon in geometry['coordinates']
+            ]
+        else:
+            raise ValueError(f"Unsupported geometry type: {geometry['type']}")
+        properties = {
+            key: value for key, value in feature.get('properties', {}).items()
+            if key in KEPT_PROPERTIES
+        }
+        features.append({
+            'type': 'Feature',
+            'properties': properties,
+            'geometry': {'type': geometry['type'], 'coordinates': coordinates},
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+@lru_cache(maxsize=1)
+def load_brazil_states(path=GEOJSON_PATH):
+    """Loads the bundled states GeoJSON, once per process.
+
+    Args:
+        path (str or Path, optional): The GeoJSON file. Defaults to the
+                                      bundled one.
+
+    Returns:
+        dict or None: The FeatureCollection, shared by every session, or None
+                      if the file has not been generated.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def refresh_geojson(url=SOURCE_URL, output=GEOJSON_PATH, tolerance=DEFAULT_TOLERANCE, timeout=30):
+    """Downloads the states GeoJSON, simplifies it and writes the bundled file.
+
+    Args:
+        url (str, optional): The source GeoJSON, as a URL or a local file
+                             (for machines without internet access).
+        output (str or Path, optional): The file to write.
+        tolerance (float, optional): The simplification tolerance, in degrees.
+        timeout (int, optional): The download timeout, in seconds.
+
+    Returns:
+        tuple: The size in bytes of the downloaded and of the written GeoJSON.
+    """
+    if Path(url).exists():
+        content = Path(url).read_bytes()
+    else:
+        import requests
+
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        content = response.content
+    simplified = simplify_geojson(json.loads(content), tolerance)
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    payload = json.dumps(simplified, ensure_ascii=False, separators=(',', ':'))
+    output.write_text(payload, encoding='utf-8')
+    load_brazil_states.cache_clear()
+    return len(content), len(payload.encode('utf-8'))
+
+
+def main(argv=None):
+    """Command-line entry point that refreshes the bundled GeoJSON."""
+    parser = argparse.ArgumentParser(description='Atualiza o GeoJSON simplificado dos estados usado no mapa.')
+    parser.add_argument('--url', default=SOURCE_URL, help='endereço ou arquivo local do GeoJSON de origem')
+    parser.add_argument('--output', type=Path, default=GEOJSON_PATH, help='arquivo gerado')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='tolerância da simplificação, em graus')
+    args = parser.parse_args(argv)
+    original, simplified = refresh_geojson(args.url, args.output, args.tolerance)
+    print(f"GeoJSON salvo em {args.output}: {original / 1024:.0f} KiB -> {simplified / 1024:.0f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Set PROUNI_INSTRUMENTATION=1 to record timing spans, log them as JSON and
+# show the debug panel of the dashboard. When unset, `span` returns a shared
+# no-op object and costs one attribute lookup and a function call.
+ENABLED = os.environ.get('PROUNI_INSTRUMENTATION', '') not in ('', '0')
+
+if ENABLED and not logger.handlers and not logging.getLogger().handlers:
+    # nothing configured logging: print the spans rather than drop them
+    logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+_trace = contextvars.ContextVar('trace', default=None)
+_depth = contextvars.ContextVar('depth', default=0)
+
+
+class _NoopSpan:
+    recording = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """A timed stage, with attributes such as rows and bytes moved.
+
+    Spans nest: a span opened inside another one is recorded one level
+    deeper. On exit it is appended to the current trace, if any, and logged
+    as a JSON object at INFO level.
+
+    Args:
+        name (str): The name of the stage.
+        **attributes: Attributes known when the stage starts.
+    """
+
+    recording = True
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """Adds attributes to the span, e.g. the rows a query returned."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._depth = _depth.get()
+        self._token = _depth.set(self._depth + 1)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        elapsed = time.perf_counter() - self._start
+        _depth.reset(self._token)
+        record = {
+            'span': self.name,
+            'depth': self._depth,
+            'ms': round(elapsed * 1000, 3),
+            **self.attributes,
+        }
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        trace = _trace.get()
+        if trace is not None:
+            record['start_ms'] = round((self._start - trace['start']) * 1000, 3)
+            trace['spans'].append(record)
+        logger.info(json.dumps(record, default=str, ensure_ascii=False))
+        return False
+
+
+def span(name, **attributes):
+    """Opens a timing span, or a no-op when instrumentation is disabled.
+
+    Attributes that are costly to compute should only be set when the span
+    is `recording`.
+
+    Args:
+        name (str): The name of the stage.
+        **attributes: Attributes known when the stage starts.
+
+    Returns:
+        Span: A context manager whose `set` method adds attributes.
+    """
+    if not ENABLED:
+        return _NOOP
+    return Span(name, **attributes)
+
+
+def log_event(name, **fields):
+    """Logs a structured event, such as cache counters, when instrumentation is enabled."""
+    if ENABLED:
+        logger.info(json.dumps({'event': name, **fields}, default=str, ensure_ascii=False))
+
+
+@contextmanager
+def trace():
+    """Collects the spans closed in the current context, such as one rerun.
+
+    Yields:
+        list: The span records, in the order they were closed. It stays
+              empty when instrumentation is disabled.
+    """
+    spans = []
+    if not ENABLED:
+        yield spans
+        return
+    token = _trace.set({'start': time.perf_counter(), 'spans': spans})
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
+
+
+@contextmanager
+def profiled(enabled=True, limit=40):
+    """Profiles the enclosed code with cProfile.
+
+    Args:
+        enabled (bool, optional): Whether to profile; when False this does
+                                  nothing, so callers can pass a flag.
+        limit (int, optional): The number of functions in the report.
+
+    Yields:
+        dict: Filled on exit with the `report` (the functions with the most
+              cumulative time) or an `error` when another profiler is
+              already running in the process.
+    """
+    result = {}
+    if not enabled:
+        yield result
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        result['error'] = str(e)
+        yield result
+        return
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+        result['report'] = stream.getvalue()
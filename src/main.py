@@ -1,48 +1,86 @@
+import os
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 import streamlit as st
-from src.utils import load_data_with_join
-from src.components.sidebar import show_sidebar, show_record_count
+from src.dataset import get_partitioned_dataset
+from src.partitions import describe_years, find_partitions, select_partitions
+from src.components.sidebar import selected_years, show_sidebar, show_record_count
 from src.components.metrics import show_metrics
 from src.components.charts import show_charts
 from src.components.data_table import show_data_table
+from src.components.export import show_export
+from src.components.sections import timed_section
+from src.components.debug import profile_requested, show_debug_panel
+from src.instrumentation import profiled, span, trace
 
 def main():
     """
     Main function that orchestrates the creation and display of the dashboard.
+
+    Each section receives everything it depends on as arguments. A change
+    of filters reruns the whole script; the table and the export are
+    fragments, so their own widgets only rerun that section.
+
+    Each Prouni year is a partition of its own. Only the partitions of the
+    years selected in the sidebar are read, and the metrics and charts of
+    several years are aggregated per partition and merged.
+
+    With `PROUNI_INSTRUMENTATION=1`, every stage is a timing span and the
+    debug panel at the bottom shows them, optionally with a cProfile report.
     """
     # ---- Page configuration ----
-    db_path = Path.cwd() / 'data' / 'clean_prouni.sqlite'
+    # one clean database per Prouni year, written by the ETL
+    partitions = find_partitions(Path.cwd() / 'data')
+    # 'parquet' reads the columnar copy written by the ETL
+    backend = os.environ.get('PROUNI_BACKEND', 'sqlite')
     st.set_page_config(
-        page_title='Cursos Prouni 2018',
+        page_title='Cursos Prouni',
         layout='wide',
         initial_sidebar_state='expanded'
     )
 
-    st.title('Cursos Prouni 2018')
-    st.subheader('Análise exploratória dos cursos e bolsas de estudos disponíveis no PROUNI 2018')
+    if not partitions:
+        st.error("Nenhum banco de dados encontrado em data/. Execute o ETL: python -m src.etl")
+        st.stop()
 
-    # ---- Sidebar and Filters ----
-    active_filters = show_sidebar(db_path)
+    # only the partitions of the selected years are read
+    selected = select_partitions(partitions, selected_years(list(partitions)))
+    db_paths = list(selected.values())
+    years = describe_years(selected)
 
-    # ---- Data Loadings ----
-    df_filtred = load_data_with_join(db_path, filters=active_filters)
-    
-    # ---- Dashboard ----
-    if df_filtred.empty:
-        st.warning("Nenhum dado encontrado com os filtros selecionados.")
-        st.stop()
+    st.title(f'Cursos Prouni {years}')
+    st.subheader(f'Análise exploratória dos cursos e bolsas de estudos disponíveis no PROUNI {years}')
+
+    with trace() as spans, profiled(profile_requested()) as profile:
+        # ---- Data Loadings ----
+        # the dataset is shared by every session; only the selected rows are taken
+        with timed_section("Carga dos dados"):
+            dataset = get_partitioned_dataset(selected, backend=backend)
+
+        # ---- Sidebar and Filters ----
+        active_filters = show_sidebar(dataset, db_paths, list(partitions))
+        with span('dataset.count'):
+            record_count = dataset.count(active_filters)
+
+        # ---- Dashboard ----
+        if record_count == 0:
+            st.warning("Nenhum dado encontrado com os filtros selecionados.")
+            st.stop()
+
+        show_record_count(record_count)
+
+        show_metrics(db_paths, active_filters)
 
-    show_record_count(df_filtred)
+        show_charts(dataset, db_paths, active_filters)
 
-    show_metrics(df_filtred)
+        show_data_table(dataset, active_filters, record_count)
 
-    show_charts(df_filtred)
+        show_export(dataset, active_filters, record_count)
 
-    show_data_table(df_filtred)
+    show_debug_panel(spans, profile, selected, dataset)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,111 @@
+import re
+from pathlib import Path
+
+from src.config import BASE_DIR
+
+# Each Prouni year is a partition of its own: the raw `prouni_<ano>.sqlite`
+# is cleaned into `clean_prouni_<ano>.sqlite` and its Parquet copy, so
+# queries only open the files of the selected years. The files without a
+# year, from before the data was partitioned, hold DEFAULT_YEAR.
+DEFAULT_YEAR = 2018
+YEAR_COLUMN = 'ano'
+DATA_DIR = BASE_DIR / 'data'
+
+_FILE_PATTERN = re.compile(r'^(clean_)?prouni(?:_(\d{4}))?\.sqlite$')
+
+
+def _scan(data_dir, clean):
+    found = {}
+    for path in sorted(Path(data_dir).glob('*prouni*.sqlite')):
+        match = _FILE_PATTERN.match(path.name)
+        if match is None or bool(match.group(1)) != clean:
+            continue
+        year = int(match.group(2)) if match.group(2) else DEFAULT_YEAR
+        # a file named after DEFAULT_YEAR wins over the one without a year
+        if match.group(2) or year not in found:
+            found[year] = path
+    return dict(sorted(found.items()))
+
+
+def partition_path(year, data_dir=DATA_DIR):
+    """Returns the clean database of a year, as written by the ETL.
+
+    Args:
+        year (int): The Prouni year.
+        data_dir (str or Path, optional): The data directory.
+
+    Returns:
+        Path: `clean_prouni_<ano>.sqlite` in the data directory.
+    """
+    return Path(data_dir) / f'clean_prouni_{int(year)}.sqlite'
+
+
+def find_partitions(data_dir=DATA_DIR):
+    """Lists the clean databases of every year available.
+
+    Args:
+        data_dir (str or Path, optional): The data directory.
+
+    Returns:
+        dict: The path of the clean database of each year, by year in
+              ascending order. Empty when the ETL has not run.
+    """
+    return _scan(data_dir, clean=True)
+
+
+def find_sources(data_dir=DATA_DIR):
+    """Lists the raw databases of every year, with the clean database of each.
+
+    The raw database without a year keeps `clean_prouni.sqlite` as its
+    clean database, so existing installations are not rebuilt.
+
+    Args:
+        data_dir (str or Path, optional): The data directory.
+
+    Returns:
+        dict: The `(source, target)` paths of each year, by year in
+              ascending order.
+    """
+    sources = {}
+    for year, source in _scan(data_dir, clean=False).items():
+        if source.name == 'prouni.sqlite':
+            target = Path(data_dir) / 'clean_prouni.sqlite'
+        else:
+            target = partition_path(year, data_dir)
+        sources[year] = (source, target)
+    return sources
+
+
+def select_partitions(partitions, years=None):
+    """Prunes the partitions to the selected years.
+
+    Args:
+        partitions (dict): The path of each year, as returned by `find_partitions`.
+        years (list, optional): The selected years. Every year when empty.
+
+    Returns:
+        dict: The path of each selected year that has a partition.
+    """
+    if not years:
+        return dict(partitions)
+    return {year: path for year, path in partitions.items() if year in years}
+
+
+def describe_years(years):
+    """Formats a selection of years for titles, e.g. "2018 a 2020".
+
+    Args:
+        years (iterable): The selected years.
+
+    Returns:
+        str: The years in ascending order; consecutive years are shown as
+             a range.
+    """
+    years = sorted(years)
+    if not years:
+        return ''
+    if len(years) > 2 and years[-1] - years[0] == len(years) - 1:
+        return f'{years[0]} a {years[-1]}'
+    if len(years) == 1:
+        return str(years[0])
+    return ', '.join(map(str, years[:-1])) + f' e {years[-1]}'
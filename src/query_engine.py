@@ -0,0 +1,280 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from src.instrumentation import span
+
+
+class ConnectionPool:
+    """A bounded pool of read-only SQLite connections.
+
+    Connections are opened lazily (up to `max_connections`) in read-only
+    mode and can be shared between threads, one borrower at a time.
+
+    Args:
+        db_path (str or Path): The path to the SQLite database.
+        max_connections (int, optional): The maximum number of open
+                                         connections. Defaults to 4.
+    """
+
+    def __init__(self, db_path, max_connections=4):
+        self.db_path = Path(db_path)
+        self.max_connections = max_connections
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_open = self._opened < self.max_connections
+            if can_open:
+                self._opened += 1
+        if not can_open:
+            return self._idle.get()
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            raise
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection from the pool, blocking if all are in use.
+
+        Yields:
+            sqlite3.Connection: A read-only connection to the database.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Closes every idle connection held by the pool."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
+class ResultCache:
+    """A thread-safe LRU cache bounded by entry count and memory.
+
+    Args:
+        max_entries (int, optional): The maximum number of cached results.
+                                     Defaults to 64.
+        max_bytes (int, optional): The maximum total size, in bytes, of the
+                                   cached results. Defaults to 256 MiB.
+        ttl (float, optional): The number of seconds after which an entry
+                               expires. Defaults to no expiration.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=256 * 1024 ** 2, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= entry[1]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Stores `value` under `key`, evicting the least recently used entries.
+
+        Values larger than `max_bytes` are not cached.
+        """
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (value, size, expires)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """Drops every cached entry, keeping the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns the cache counters.
+
+        Returns:
+            dict: Hits, misses, evictions, expirations, hit rate, entries and
+                  bytes in use.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+
+def normalize_filters(filters):
+    """Builds a hashable, order-independent key from a filter dictionary.
+
+    Empty filters are dropped, columns are sorted and list values are
+    deduplicated and sorted, so equivalent selections share the same key.
+
+    Args:
+        filters (dict or None): A dictionary of column names to a value or
+                                a list of values.
+
+    Returns:
+        tuple: The normalized filters.
+    """
+    if not filters:
+        return ()
+    normalized = []
+    for column, value in filters.items():
+        if not value:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(set(value), key=str))
+        normalized.append((column, value))
+    return tuple(sorted(normalized))
+
+
+class QueryEngine:
+    """Runs read-only queries against a database with pooled connections
+    and a shared result cache.
+
+    Results are keyed by the caller-provided key plus the database file
+    identity, so a rebuilt database never serves stale results.
+
+    Args:
+        db_path (str or Path): The path to the SQLite database.
+        max_connections (int, optional): The connection pool size. Defaults to 4.
+        cache (ResultCache, optional): The result cache. Defaults to a new
+                                       `ResultCache`.
+    """
+
+    def __init__(self, db_path, max_connections=4, cache=None):
+        self.db_path = Path(db_path)
+        self.max_connections = max_connections
+        self.cache = cache if cache is not None else ResultCache()
+        self.pool = ConnectionPool(self.db_path, max_connections)
+        self._file_id = None
+        self._lock = threading.Lock()
+
+    def _current_file_id(self):
+        stat = os.stat(self.db_path)
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if self._file_id is not None and file_id[0] != self._file_id[0]:
+                # The file was replaced, so pooled connections point to the old one.
+                self.pool.close()
+                self.pool = ConnectionPool(self.db_path, self.max_connections)
+            self._file_id = file_id
+        return file_id
+
+    def read_frame(self, query, params=(), key=None, dtype=None):
+        """Runs a query and returns its result as a DataFrame.
+
+        Args:
+            query (str): The SQL query.
+            params (list, optional): The query parameters.
+            key (hashable, optional): The cache key for the result. The
+                                      result is not cached when omitted.
+            dtype (dict, optional): The dtypes to apply to the result columns.
+
+        Returns:
+            pd.DataFrame: The query result. Cached frames are shared between
+                          callers and must be treated as read-only.
+        """
+        with span('query', key=key[0] if isinstance(key, tuple) else key) as query_span:
+            file_id = self._current_file_id()
+            cache_key = (key, file_id) if key is not None else None
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    query_span.set(rows=len(cached), cached=True)
+                    return cached
+
+            with self.pool.connection() as conn:
+                df = pd.read_sql_query(query, conn, params=list(params), dtype=dtype)
+
+            if cache_key is not None or query_span.recording:
+                size = int(df.memory_usage(deep=True).sum())
+                query_span.set(rows=len(df), bytes=size, cached=False)
+                if cache_key is not None:
+                    self.cache.put(cache_key, df, size)
+            return df
+
+    def stats(self):
+        """Returns the result cache counters."""
+        return self.cache.stats()
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_query_engine(db_path):
+    """Returns the process-wide query engine for a database.
+
+    Args:
+        db_path (str or Path): The path to the SQLite database.
+
+    Returns:
+        QueryEngine: The engine shared by every session of this process.
+    """
+    key = str(Path(db_path).resolve())
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = QueryEngine(db_path)
+        return engine
@@ -0,0 +1,144 @@
+import re
+
+import pandas as pd
+
+from src.config import SEARCH_DOCUMENTS_QUERY
+from src.query_engine import get_query_engine
+from src.utils import remove_accents, remove_accents_series
+
+SEARCH_TABLE = 'busca'
+
+# Name matches weigh more than matches in the campuses and municipalities.
+NAME_WEIGHT = 10.0
+CONTEXT_WEIGHT = 1.0
+
+# The text is indexed without accents and in lowercase, and the tokenizer
+# also folds any diacritic left; prefix indexes of 2 and 3 characters make
+# the short prefixes typed in the search box cheap.
+SEARCH_TABLE_DEFINITION = f"""
+CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+    nome,
+    contexto,
+    coluna UNINDEXED,
+    valor UNINDEXED,
+    registros UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def normalize_search_text(texts):
+    """Lowercases a column of texts and removes their accents, as indexed.
+
+    Args:
+        texts (pd.Series): The texts to normalize.
+
+    Returns:
+        pd.Series: The normalized texts.
+    """
+    return remove_accents_series(texts.fillna('')).str.lower()
+
+
+def build_search_index(conn):
+    """Rebuilds the full-text search table from `cursos_enderecos`.
+
+    Args:
+        conn (sqlite3.Connection): The connection to the clean database,
+                                   inside the transaction of the ETL.
+
+    Returns:
+        int: The number of indexed documents.
+    """
+    documents = pd.read_sql_query(SEARCH_DOCUMENTS_QUERY, conn)
+    documents = documents[documents['valor'].notna()]
+    conn.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+    conn.execute(SEARCH_TABLE_DEFINITION)
+    conn.executemany(
+        f'INSERT INTO {SEARCH_TABLE} (nome, contexto, coluna, valor, registros) VALUES (?, ?, ?, ?, ?)',
+        zip(
+            normalize_search_text(documents['valor']),
+            normalize_search_text(documents['contexto']),
+            documents['coluna'],
+            documents['valor'],
+            documents['registros'].astype(int).tolist(),
+        ),
+    )
+    return len(documents)
+
+
+def build_match_expression(text):
+    """Turns the text typed by the user into an FTS5 prefix query.
+
+    Every word must match the start of a word of the document, in any
+    order, so "eng civ" finds "Engenharia Civil".
+
+    Args:
+        text (str): The text typed by the user.
+
+    Returns:
+        str or None: The MATCH expression, or None if the text has no words.
+    """
+    tokens = _TOKEN_PATTERN.findall(remove_accents(text).lower())
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def has_search_index(db_path):
+    """Tells whether the database has the search table (built by the ETL)."""
+    tables = get_query_engine(db_path).read_frame(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", [SEARCH_TABLE],
+        key=('search_index',),
+    )
+    return not tables.empty
+
+
+def search(db_path, text, limit=10):
+    """Searches courses and universities by name, campus or municipality.
+
+    Results are ranked by BM25, with name matches weighing more than
+    campus and municipality matches, then by number of records. With
+    several year partitions, each index is searched on its own and the
+    hits of the same course or university are merged, keeping their best
+    rank and adding up their records.
+
+    Args:
+        db_path (str, Path or list): The path to the SQLite database, or the
+                                     paths of the partitions to search.
+        text (str): The text typed by the user; accents and case are ignored.
+        limit (int, optional): The maximum number of results.
+
+    Returns:
+        pd.DataFrame: The `coluna` (the filter column, `curso_busca` or
+                      `universidade_nome`), the `valor` and the number of
+                      `registros` of each result, best first. Empty when
+                      the text has no words or the index was not built.
+    """
+    columns = ['coluna', 'valor', 'registros']
+    match = build_match_expression(text)
+    paths = list(db_path) if isinstance(db_path, (list, tuple)) else [db_path]
+    paths = [path for path in paths if has_search_index(path)] if match is not None else []
+    if not paths:
+        return pd.DataFrame(columns=columns)
+    query = f"""
+        SELECT coluna, valor, registros, bm25({SEARCH_TABLE}, {NAME_WEIGHT}, {CONTEXT_WEIGHT}) AS rank
+        FROM {SEARCH_TABLE}
+        WHERE {SEARCH_TABLE} MATCH ?
+        ORDER BY rank, registros DESC
+        LIMIT ?
+    """
+    hits = [
+        get_query_engine(path).read_frame(query, [match, int(limit)], key=('search', match, int(limit)))
+        for path in paths
+    ]
+    hits = [hit for hit in hits if not hit.empty] or hits[:1]
+    if len(hits) == 1:
+        return hits[0][columns]
+    merged = pd.concat(hits, ignore_index=True).groupby(['coluna', 'valor'], as_index=False).agg(
+        registros=('registros', 'sum'), rank=('rank', 'min')
+    )
+    merged = merged.sort_values(['rank', 'registros'], ascending=[True, False], kind='stable')
+    return merged.head(int(limit))[columns].reset_index(drop=True)
@@ -3,9 +3,15 @@ import numpy as np
 import unicodedata
 import re
 import numpy as np
+import logging
 import sqlite3
+import sys
 from pathlib import Path
 import streamlit as st
+from src.query_engine import get_query_engine, normalize_filters
+from src.columnar import read_table
+
+logger = logging.getLogger(__name__)
 
 def clean_phone(phone_column):
     """Clears and normalizes a phone number.
@@ -86,51 +92,85 @@ def remove_accents(text):
     # Mantém apenas os caracteres que não são de combinação (os acentos)
     return "".join([c for c in nfkd_form if not unicodedata.combining(c)])
     
-def load_data_with_join(db_path, filters=None):
-    """Loads and joins data from tables, applying dynamic filters.
+def _non_ascii_digits_class():
+    """Builds a regex character class with the non-ASCII characters Python treats as digits.
+
+    Every code point is tested at once with numpy's `isdigit`, which follows
+    the same Unicode database as `str.isdigit`, instead of one by one.
+    """
+    codes = np.arange(sys.maxunicode + 1, dtype=np.uint32)
+    digits = np.char.isdigit(codes.view('<U1')) & (codes >= 128)
+    bounds = np.flatnonzero(np.diff(np.concatenate(([0], digits.view(np.int8), [0]))))
+    ranges = [f"{re.escape(chr(start))}-{re.escape(chr(end - 1))}" for start, end in zip(bounds[::2], bounds[1::2])]
+    return f"[{''.join(ranges)}]"
 
-    This function executes an SQL query to join the `courses` and
-    `addresses` and applies filters based on the provided dictionary.
+_NON_ASCII_DIGITS = _non_ascii_digits_class()
+
+def _to_arrow_text(values):
+    """Converts a column to Arrow-backed strings.
+
+    Arrow's regex kernels only treat ASCII 0-9 as digits, while Python's
+    `\\d` and `str.isdigit` also accept other Unicode digits, so the rows
+    holding such characters are flagged to go through the scalar functions.
+    """
+    text = values.astype('string[pyarrow]')
+    unicode_digits = text.str.contains(_NON_ASCII_DIGITS, regex=True).fillna(False).astype(bool)
+    return text, unicode_digits
+
+def clean_phone_series(phones):
+    """Vectorized version of `clean_phone` for a whole column.
 
     Args:
-        db_path (str or Path): The path to the SQLite database.
-        filters (dict, optional): A dictionary of filters to apply
-                                  in the consultation. The keys are the names of the
-                                  columns and the values ​​are the values ​​to
-                                  filter. Defaults to None.
+        phones (pd.Series): The phone column to clear.
 
     Returns:
-        pd.DataFrame: A Pandas DataFrame with the filtered data.
-    
-    Raises:
-        ValueError: If an error occurs while loading the data.
+        pd.Series: The same values `clean_phone` returns for each row.
     """
-    base_query = """
-    SELECT 
-        c.curso_busca AS curso,
-        c.grau AS nível,
-        c.turno AS período,
-        c.mensalidade,
-        c.universidade_nome AS universidade,
-        c.campus_nome,
-        c.bolsa_integral_cotas,
-        c.nota_integral_cotas AS nota_corte_integral_cotas,
-        c.bolsa_integral_ampla AS bolsa_integral,
-        c.nota_integral_ampla AS nota_corte_integral,
-        c.bolsa_parcial_cotas,
-        c.nota_parcial_cotas AS nota_parcial_cotas,
-        c.bolsa_parcial_ampla AS bolsa_parcial,
-        c.nota_parcial_ampla AS nota_parcial,
-        e.municipio_limpo AS município,
-        e.uf AS estado,
-        e.telefone_formatado AS telefone
-    FROM 
-        cursos AS c
-    INNER JOIN 
-        enderecos AS e ON c.campus_id = e.id
+    text, unicode_digits = _to_arrow_text(phones)
+    has_extension = text.str.contains('ramal', case=False, regex=False).fillna(False)
+    digits = text.str.replace(r'\D+', '', regex=True)
+    length = digits.str.len()
+    use_digits = ((length.between(8, 11) | length.between(19, 21)) & ~has_extension).fillna(False)
+
+    cleaned = text.mask(use_digits, digits).astype(object)
+    cleaned[phones.isna()] = 'Não especificado'
+    cleaned[unicode_digits] = phones[unicode_digits].map(clean_phone)
+    return cleaned
+
+def remove_accents_series(texts):
+    """Vectorized version of `remove_accents` for a whole column.
+
+    Each distinct value is normalized only once and mapped back to the
+    rows, which makes low-cardinality columns such as municipality names
+    cheap to process.
+
+    Args:
+        texts (pd.Series): The column to remove accents from.
+
+    Returns:
+        pd.Series: The same values `remove_accents` returns for each row.
+    """
+    codes, uniques = pd.factorize(texts.astype(str))
+    normalized = pd.Series(uniques, dtype=object).str.normalize('NFKD')
+    # only the characters present in the values are looked up
+    marks = {ord(char): None for char in set(''.join(normalized)) if unicodedata.combining(char)}
+    stripped = normalized.str.translate(marks)
+    return pd.Series(stripped.to_numpy()[codes], index=texts.index, dtype=object)
+
+def build_where_clause(filters):
+    """Builds the SQL WHERE clause for the dashboard filters.
+
+    List values become `column IN (...)` and any other value becomes a
+    `column LIKE '%value%'` search. Empty values are ignored.
+
+    Args:
+        filters (dict or None): A dictionary of column names to the values
+                                to filter.
+
+    Returns:
+        tuple: The WHERE clause (an empty string if there is nothing to
+               filter) and the list of query parameters.
     """
-    
-    conn = None
     params = []
     where_clauses = []
 
@@ -139,24 +179,157 @@ def load_data_with_join(db_path, filters=None):
             if value:
                 if isinstance(value, list):
                     placeholders = ','.join('?' for _ in value)
-                    where_clauses.append(f"TRIM({column}) IN ({placeholders})")
+                    where_clauses.append(f"{column} IN ({placeholders})")
                     params.extend(value)
                 else:
-                    where_clauses.append(f"TRIM({column}) LIKE ?")
+                    where_clauses.append(f"{column} LIKE ?")
                     params.append(f'%{value}%')
 
-    if where_clauses:
-        base_query += " WHERE " + " AND ".join(where_clauses)
+    if not where_clauses:
+        return "", params
+    return " WHERE " + " AND ".join(where_clauses), params
 
-    try:
-        conn = sqlite3.connect(db_path)
-        df_filtered = pd.read_sql_query(base_query, conn, params=params)
+# Typed schema of the numeric columns returned by `load_data_with_join`.
+# Missing fees and grades of modalities that were not offered are NaN.
+NUMERIC_SCHEMA = {
+    'mensalidade': 'float64',
+    'nota_corte_integral_cotas': 'float64',
+    'nota_corte_integral': 'float64',
+    'nota_parcial_cotas': 'float64',
+    'nota_parcial': 'float64',
+    'bolsa_integral_cotas': 'Int32',
+    'bolsa_integral': 'Int32',
+    'bolsa_parcial_cotas': 'Int32',
+    'bolsa_parcial': 'Int32',
+}
+
+# Text columns returned as categoricals. They repeat across the courses of
+# a campus, so each value is stored once with a small integer code per row.
+CATEGORICAL_COLUMNS = [
+    'curso', 'nível', 'período', 'universidade', 'campus_nome', 'município', 'estado', 'telefone',
+]
+
+# Full schema applied to every load, whatever the backend.
+DATA_SCHEMA = {**NUMERIC_SCHEMA, **{column: 'category' for column in CATEGORICAL_COLUMNS}}
+
+def memory_report(df):
+    """Reports the memory used by each column of a DataFrame.
+
+    Args:
+        df (pd.DataFrame): The DataFrame to inspect.
+
+    Returns:
+        pd.DataFrame: The dtype and size in bytes of each column, largest
+                      first.
+    """
+    usage = df.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({'dtype': df.dtypes.astype(str), 'bytes': usage})
+    return report.sort_values('bytes', ascending=False)
+
+def _log_memory(df, backend):
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    report = memory_report(df)
+    logger.info(
+        "Loaded %d rows from %s: %.1f MiB", len(df), backend, report['bytes'].sum() / 1024 ** 2
+    )
+    logger.debug("Memory per column:\n%s", report.to_string())
+
+# Columns of `cursos_enderecos` loaded by the dashboard, with their display names.
+JOIN_COLUMNS = {
+    'curso_busca': 'curso',
+    'grau': 'nível',
+    'turno': 'período',
+    'mensalidade': 'mensalidade',
+    'universidade_nome': 'universidade',
+    'campus_nome': 'campus_nome',
+    'bolsa_integral_cotas': 'bolsa_integral_cotas',
+    'nota_integral_cotas': 'nota_corte_integral_cotas',
+    'bolsa_integral_ampla': 'bolsa_integral',
+    'nota_integral_ampla': 'nota_corte_integral',
+    'bolsa_parcial_cotas': 'bolsa_parcial_cotas',
+    'nota_parcial_cotas': 'nota_parcial_cotas',
+    'bolsa_parcial_ampla': 'bolsa_parcial',
+    'nota_parcial_ampla': 'nota_parcial',
+    'municipio_limpo': 'município',
+    'uf': 'estado',
+    'telefone_formatado': 'telefone',
+}
+
+BACKENDS = ('sqlite', 'parquet')
+
+def load_data_with_join(db_path, filters=None, backend='sqlite'):
+    """Loads the joined course and address data, applying dynamic filters.
+
+    With the `sqlite` backend, this function queries the `cursos_enderecos`
+    table, materialized by the cleaning pipeline from `cursos` and
+    `enderecos`, and applies filters based on the provided dictionary. The
+    filtered columns are indexed and compared without any function around
+    them, so filters are index lookups. Queries go through the process-wide
+    query engine, so identical filter selections are served from its result
+    cache without touching SQLite.
+
+    With the `parquet` backend, the same table is read from the Parquet copy
+    written by the ETL next to the database (`.parquet` suffix). The file is
+    memory-mapped and the filters are pushed down to the reader, so columns
+    are sliced without building a Python object per value; text columns
+    come back as categoricals.
+
+    The size of every load is logged at INFO level, and per column at DEBUG.
+
+    Args:
+        db_path (str or Path): The path to the SQLite database.
+        filters (dict, optional): A dictionary of filters to apply
+                                  in the consultation. The keys are the names of the
+                                  columns of `cursos_enderecos` and the values are
+                                  the values to filter. Defaults to None.
+        backend (str, optional): `sqlite` or `parquet`. Defaults to `sqlite`.
+
+    Returns:
+        pd.DataFrame: A Pandas DataFrame with the filtered data, typed as in
+                      `DATA_SCHEMA` whatever the backend. The frame may be
+                      shared with other sessions and must not be modified
+                      in place.
+    
+    Raises:
+        ValueError: If the backend is unknown or an error occurs while
+                    loading the data.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {BACKENDS}")
+
+    if backend == 'parquet':
+        parquet_path = Path(db_path).with_suffix('.parquet')
+        try:
+            df_filtered = read_table(parquet_path, filters, columns=JOIN_COLUMNS, dtype=DATA_SCHEMA)
+        except Exception as e:
+            raise ValueError(f"Error loading data from {parquet_path}: {e}")
+        _log_memory(df_filtered, backend)
         return df_filtered
+
+    select = ',\n        '.join(
+        column if column == alias else f"{column} AS {alias}"
+        for column, alias in JOIN_COLUMNS.items()
+    )
+    base_query = f"""
+    SELECT 
+        {select}
+    FROM 
+        cursos_enderecos
+    """
+    
+    where_clause, params = build_where_clause(filters)
+    base_query += where_clause
+
+    try:
+        engine = get_query_engine(db_path)
+        df_filtered = engine.read_frame(
+            base_query, params, key=('join', normalize_filters(filters)), dtype=DATA_SCHEMA
+        )
     except Exception as e:
         raise ValueError(f"Error loading data from {db_path}: {e}")
-    finally:
-        if conn:
-            conn.close()
+    _log_memory(df_filtered, backend)
+    return df_filtered
             
 @st.cache_data
 def get_unique_values(db_path, table_name, column_name):
@@ -195,7 +368,7 @@ def format_to_brazilian_currency(number):
         str: The number formatted as currency (ex: R$ 1,234.56) or "R$ -" if
              the entry is null.
     """
-    if number is None or not isinstance(number, (int, float)):
+    if number is None or not isinstance(number, (int, float)) or pd.isna(number):
         return "R$ -"
 
     # Formata com vírgula para milhar e ponto para decimal (padrão americano)